@@ -1,8 +1,8 @@
 from enum import Enum
-from datetime import datetime
-from typing import Dict, List, Tuple
-import matplotlib.pyplot as plt
-from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, defaultdict
 
 # Define Enums for different types of parts
 class SolderType(Enum):
@@ -95,90 +95,879 @@ PART_CLASSES = {
     "5": EthernetCable
 }
 
+# Attributes of each part class in constructor order, every one of them is indexed for search
+PART_FIELDS = {
+    Resistor: ("resistance", "tolerance"),
+    Solder: ("solder_type", "length"),
+    Wire: ("gauge", "length"),
+    DisplayCable: ("cable_type", "length", "color"),
+    EthernetCable: ("alpha_type", "beta_type", "ether_speed", "length")
+}
+
+# Part classes by name and the Enum type of every enum attribute, used to rebuild stored parts
+PART_TYPES = {part_type.__name__: part_type for part_type in PART_FIELDS}
+
+ENUM_FIELDS = {
+    "solder_type": SolderType,
+    "cable_type": DisplayCableType,
+    "alpha_type": EthernetCableAlphaType,
+    "beta_type": EthernetCableBetaType,
+    "ether_speed": EthernetCableSpeed
+}
+
+# Timestamps as whole microseconds since the epoch, for compact storage
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch(update: datetime) -> int:
+    return (update - EPOCH) // timedelta(microseconds=1)
+
+def from_epoch(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+# Converts a part to plain values (Enums by value) and back, for storage and export
+def part_to_dict(part: Part) -> Dict[str, object]:
+    data = {"type": type(part).__name__, "update": part.update.isoformat()}
+    for attr in PART_FIELDS[PART_TYPES[type(part).__name__]]:
+        value = getattr(part, attr)
+        data[attr] = value.value if isinstance(value, Enum) else value
+    return data
+
+def part_from_dict(data: Dict[str, object]) -> Part:
+    part_type = PART_TYPES[data["type"]]
+    values = [ENUM_FIELDS[attr](data[attr]) if attr in ENUM_FIELDS else data[attr] for attr in PART_FIELDS[part_type]]
+    return part_type(datetime.fromisoformat(data["update"]), *values)
+
+# Line of each part class in listings, a str.format template over the part compiled once at registration
+# instead of an isinstance chain per row. Subclasses without a formatter of their own use the one of
+# their closest registered base class.
+PART_FORMATTERS: Dict[type, Callable[..., str]] = {}
+
+def register_formatter(part_type: type, name: str, characteristics: str):
+    PART_FORMATTERS[part_type] = f"Part: {name}, Characteristics: {characteristics}".format
+
+def format_part(part: Part) -> str:
+    formatter = PART_FORMATTERS.get(type(part))
+    if formatter is None:
+        formatter = next(PART_FORMATTERS[cls] for cls in type(part).__mro__ if cls in PART_FORMATTERS)
+    return formatter(part=part)
+
+# One (sku, data) row of get_inventory or list_inventory as printed by the menu
+def format_row(sku: int, data: Dict[str, Part]) -> str:
+    return f"SKU: {sku}, {format_part(data['part'])}, Quantity: {data['quantity']}"
+
+register_formatter(Part, "Part", "{part}")
+register_formatter(Resistor, "Resistor", "Resistance: {part.resistance} ohms, Tolerance: {part.tolerance}%")
+register_formatter(Solder, "Solder", "Type: {part.solder_type.value}, Length: {part.length} ft")
+register_formatter(Wire, "Wire", "Gauge: {part.gauge}, Length: {part.length} ft")
+register_formatter(DisplayCable, "Display Cable", "Type: {part.cable_type.value}, Length: {part.length} ft, Color: {part.color}")
+register_formatter(EthernetCable, "Ethernet Cable", "Alpha Type: {part.alpha_type.value}, Beta Type: {part.beta_type.value}, "
+                                                    "Speed: {part.ether_speed.value}, Length: {part.length} ft")
+
+# Numeric attributes that also get a sorted index for range and nearest-value queries
+RANGE_FIELDS = ("resistance", "tolerance", "gauge", "length")
+
+def _is_sortable(value) -> bool:
+    return isinstance(value, (int, float)) and value == value  # NaN has no place in a sorted index
+
+def _in_bounds(value, low, high) -> bool:
+    return (low is None or value >= low) and (high is None or value <= high)
+
+# Turns a NumPy array or any other iterable into a list of plain Python values
+def _as_list(values) -> list:
+    return values.tolist() if hasattr(values, "tolist") else list(values)
+
+# Cache key of a search, None if a value cannot be hashed
+def _search_key(part_class: str, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> Optional[tuple]:
+    key = (part_class, tuple(sorted(bounds.items())), tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+# Raises InvalidArgumentError for a search attribute the part class does not have
+def _check_fields(part_type: type, names) -> None:
+    for name in names:
+        if name not in PART_FIELDS[part_type]:
+            raise InvalidArgumentError(f"Invalid attribute for {part_type.__name__}: {name}")
+
+# Keys in ascending order (SKUs, or (value, SKU) pairs of a range index), kept as sorted blocks of up to
+# 2 * block_size keys so adding or removing one only moves the keys of its own block instead of shifting a
+# list of the whole inventory. Positions are (block, offset) pairs.
+class SortedBlocks:
+    block_size = 512
+
+    def __init__(self):
+        self.blocks: List[list] = []
+        self.maxes: list = []  # last key of every block
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator:
+        for block in self.blocks:
+            yield from block
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+        else:
+            b = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+            block = self.blocks[b]
+            insort(block, key)
+            self.maxes[b] = block[-1]
+            if len(block) > 2 * self.block_size:
+                self.blocks[b:b + 1] = [block[:self.block_size], block[self.block_size:]]
+                self.maxes[b:b + 1] = [block[self.block_size - 1], block[-1]]
+        self.size += 1
+
+    def remove(self, key):
+        b = bisect_left(self.maxes, key)
+        if b == len(self.blocks):
+            return
+        block = self.blocks[b]
+        i = bisect_left(block, key)
+        if block[i] != key:
+            return
+        del block[i]
+        self.size -= 1
+        if block:
+            self.maxes[b] = block[-1]
+        else:
+            del self.blocks[b]
+            del self.maxes[b]
+
+    # Adds many keys at once, a large batch is merged in with one sort instead of key by key
+    def update(self, keys: list):
+        if len(keys) <= len(self) // 8:
+            for key in keys:
+                self.add(key)
+            return
+        merged = list(self)
+        merged.extend(keys)
+        merged.sort()
+        self.blocks = [merged[i:i + self.block_size] for i in range(0, len(merged), self.block_size)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.size = len(merged)
+
+    # Position of the first key >= key, or > key with right=True
+    def position(self, key, right: bool = False) -> Tuple[int, int]:
+        find = bisect_right if right else bisect_left
+        b = find(self.maxes, key)
+        return (b, find(self.blocks[b], key)) if b < len(self.blocks) else (b, 0)
+
+    def count(self, start: Tuple[int, int], end: Tuple[int, int]) -> int:
+        if start >= end:
+            return 0
+        (b, i), (last, j) = start, end
+        return sum(len(block) for block in self.blocks[b:last]) - i + j
+
+    def between(self, start: Tuple[int, int], end: Tuple[int, int]) -> list:
+        if start >= end:
+            return []
+        (b, i), (last, j) = start, end
+        if b == last:
+            return self.blocks[b][i:j]
+        keys = self.blocks[b][i:]
+        for block in self.blocks[b + 1:last]:
+            keys.extend(block)
+        if last < len(self.blocks):
+            keys.extend(self.blocks[last][:j])
+        return keys
+
+    # Keys from a position on, ascending
+    def forward(self, position: Tuple[int, int]) -> Iterator:
+        b, i = position
+        for block in self.blocks[b:]:
+            yield from block[i:]
+            i = 0
+
+    # Keys before a position, nearest first
+    def backward(self, position: Tuple[int, int]) -> Iterator:
+        b, i = position
+        if b < len(self.blocks):
+            yield from reversed(self.blocks[b][:i])
+        for block in reversed(self.blocks[:b]):
+            yield from reversed(block)
+
+    # Up to limit keys after the given one (from the first key if None) and whether more follow
+    def page(self, after, limit: int) -> Tuple[list, bool]:
+        b, i = (0, 0) if after is None else self.position(after, right=True)
+        keys = []
+        while b < len(self.blocks) and len(keys) < limit:
+            taken = self.blocks[b][i:i + limit - len(keys)]
+            keys.extend(taken)
+            i += len(taken)
+            if i >= len(self.blocks[b]):
+                b, i = b + 1, 0
+        return keys, b < len(self.blocks)
+
+# Start and end position of the (value, SKU) entries with low <= value <= high, either bound may be None
+def _range_slice(entries: SortedBlocks, low, high) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    start = (0, 0) if low is None else entries.position((low,))
+    end = (len(entries.blocks), 0) if high is None else entries.position((high, float("inf")), right=True)
+    return start, max(start, end)
+
+# Errors raised by the inventory. They are all ValueErrors, so existing except ValueError clauses still catch them.
+class InventoryError(ValueError):
+    pass
+
+class SkuNotFoundError(InventoryError):
+    pass
+
+class DuplicateSkuError(InventoryError):
+    pass
+
+class CapacityError(InventoryError):
+    pass
+
+class InsufficientStockError(InventoryError):
+    pass
+
+class InvalidArgumentError(InventoryError):  # negative SKU, unknown part class, search attribute or direction, missing ledger, quantity too large for the ledger
+    pass
+
+ERROR_MODES = ("print", "raise", "silent")
+
 # Inventory class to manage parts and quantities
 class Inventory:
     def __init__(self):
         self.inventory: Dict[int, Dict[str, Part]] = {}
+        # Secondary indexes, SKUs are kept in dicts so results come back in insertion order
+        self.class_index: Dict[type, Dict[int, int]] = defaultdict(dict)  # part class -> SKU -> sequence number it was added under
+        self.attribute_index: Dict[type, Dict[str, Dict[object, Dict[int, None]]]] = {}  # part class -> attribute -> value -> SKUs
+        self.sorted_index: Dict[type, Dict[str, SortedBlocks]] = {}  # part class -> attribute -> sorted (value, SKU)
+        # Orders list_inventory pages through. The insertion log only ever grows at the end, a deleted SKU stays in it
+        # until more than half of it is stale, an entry is current while class_index holds its sequence number.
+        self.sku_index = SortedBlocks()  # every SKU, ascending
+        self.insertion_log: List[int] = []  # SKUs in the order they were added
+        self.insertion_sequences: List[int] = []  # sequence number of every insertion_log entry, ascending
+        self.next_sequence = 0
+        # Stock statistics, kept up to date by every change so the dashboard never has to walk the inventory
+        self.class_totals: Dict[type, int] = defaultdict(int)  # part class -> total quantity
+        self.out_of_stock: Dict[int, None] = {}  # SKUs currently at quantity 0
+        self.class_out_of_stock: Dict[type, int] = defaultdict(int)  # part class -> SKUs at quantity 0
+        self.stockout_events: Dict[int, int] = {}  # SKU -> times it ran out of stock
+        self.class_stockout_events: Dict[type, int] = defaultdict(int)  # part class -> times its SKUs ran out of stock
+        self.ledger = None  # optional stock_ledger.StockLedger that records every stock movement
+        # What a failed operation does besides returning its usual False/0/None/[]: "print" the error,
+        # "raise" it, or stay "silent". Stock-out notices are only printed in "print" mode.
+        self.error_mode = "print"
+        self.last_error: Optional[Exception] = None  # most recent failure, typed as one of the errors above
+        self.metrics = None  # set by inventory_metrics.instrument
+        # Search results by (part class, bounds, attributes), each stored with the version of its part class. Adding or
+        # deleting a part bumps the version of its class and every base class, so an entry is only used while no part
+        # it could contain has come or gone. Quantities do not take part in searches and do not invalidate anything.
+        self.class_versions: Dict[type, int] = defaultdict(int)
+        self.search_cache: OrderedDict = OrderedDict()  # key -> (version, parts), least recently used first
+        self.search_cache_parts = 0  # parts held by all cached results together
+        self.search_cache_hits = 0
+        self.search_cache_misses = 0
 
     max_limit = 1000000
+    max_page = 10000  # most rows list_inventory returns at once
+    replace_entries = False  # store a new entry dict on every quantity change instead of changing it in place
+    search_cache_size = 1024  # most cached searches, 0 turns the cache off
+    search_cache_limit = 1000000  # most parts held by all cached results together
+
+    # With a pending dict the keys for the sorted indexes are only collected in it, the caller adds them with
+    # SortedBlocks.update afterwards
+    def _index_part(self, sku: int, part: Part, pending: Optional[Dict[int, list]] = None):
+        part_type = type(part)
+        self._bump_versions(part_type)
+        self.class_index[part_type][sku] = self.next_sequence
+        self.insertion_log.append(sku)
+        self.insertion_sequences.append(self.next_sequence)
+        self.next_sequence += 1
+        if pending is None:
+            self.sku_index.add(sku)
+        else:
+            pending.setdefault(id(self.sku_index), (self.sku_index, []))[1].append(sku)
+        attributes = self.attribute_index.setdefault(part_type, {})
+        sorted_attributes = self.sorted_index.setdefault(part_type, {})
+        for attr in PART_FIELDS.get(part_type, ()):
+            value = getattr(part, attr)
+            attributes.setdefault(attr, {}).setdefault(value, {})[sku] = None
+            if attr in RANGE_FIELDS and _is_sortable(value):
+                entries = sorted_attributes.get(attr)
+                if entries is None:
+                    entries = sorted_attributes[attr] = SortedBlocks()
+                if pending is None:
+                    entries.add((value, sku))
+                else:
+                    pending.setdefault(id(entries), (entries, []))[1].append((value, sku))
+
+    def _unindex_part(self, sku: int, part: Part):
+        part_type = type(part)
+        self._bump_versions(part_type)
+        self.class_index[part_type].pop(sku, None)
+        self.sku_index.remove(sku)
+        if len(self.insertion_log) > 2 * len(self.inventory) + 64:
+            self._compact_log()
+        attributes = self.attribute_index.get(part_type, {})
+        sorted_attributes = self.sorted_index.get(part_type, {})
+        for attr in PART_FIELDS.get(part_type, ()):
+            values = attributes.get(attr, {})
+            value = getattr(part, attr)
+            skus = values.get(value)
+            if skus is not None:
+                skus.pop(sku, None)
+                if not skus:
+                    del values[value]
+            if attr in RANGE_FIELDS and _is_sortable(value):
+                entries = sorted_attributes.get(attr)
+                if entries is not None:
+                    entries.remove((value, sku))
+
+    # Whether insertion log entry i is the current insertion of a part still in the inventory
+    def _is_current(self, i: int) -> bool:
+        sku = self.insertion_log[i]
+        entry = self.inventory.get(sku)
+        return entry is not None and self.class_index[type(entry["part"])].get(sku) == self.insertion_sequences[i]
+
+    def _compact_log(self):
+        current = [i for i in range(len(self.insertion_log)) if self._is_current(i)]
+        self.insertion_log = [self.insertion_log[i] for i in current]
+        self.insertion_sequences = [self.insertion_sequences[i] for i in current]
+
+    def _bump_versions(self, part_type: type):
+        for cls in part_type.__mro__:
+            self.class_versions[cls] += 1
+
+    # Cached results for key if they are still current, None otherwise
+    def _cache_get(self, key: Optional[tuple], part_type: type) -> Optional[tuple]:
+        entry = self.search_cache.get(key) if key is not None else None
+        if entry is not None:
+            if entry[0] == self.class_versions[part_type]:
+                self.search_cache.move_to_end(key)
+                self.search_cache_hits += 1
+                return entry[1]
+            del self.search_cache[key]
+            self.search_cache_parts -= len(entry[1])
+        self.search_cache_misses += 1
+        return None
+
+    # Stores results computed while the part class was at version, dropping the least recently used entries over the limits
+    def _cache_put(self, key: Optional[tuple], version: int, results: List[Part]):
+        if key is None or not self.search_cache_size or len(results) > self.search_cache_limit:
+            return
+        old = self.search_cache.pop(key, None)
+        if old is not None:
+            self.search_cache_parts -= len(old[1])
+        self.search_cache[key] = (version, tuple(results))
+        self.search_cache_parts += len(results)
+        while len(self.search_cache) > self.search_cache_size or self.search_cache_parts > self.search_cache_limit:
+            _, (_, evicted) = self.search_cache.popitem(last=False)
+            self.search_cache_parts -= len(evicted)
+
+    def search_cache_stats(self) -> Dict[str, object]:
+        lookups = self.search_cache_hits + self.search_cache_misses
+        return {
+            "hits": self.search_cache_hits,
+            "misses": self.search_cache_misses,
+            "hit_rate": self.search_cache_hits / lookups if lookups else 0.0,
+            "entries": len(self.search_cache),
+            "parts": self.search_cache_parts
+        }
+
+    def _select(self, part_type: type, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> List[int]:
+        indexed_fields = PART_FIELDS.get(part_type, ())
+        attributes = self.attribute_index.get(part_type, {})
+        sorted_attributes = self.sorted_index.get(part_type, {})
+
+        # Look up indexed attributes, anything else falls back to a scan of the candidates
+        candidate_sets = []
+        unindexed = {}
+        for attr, value in kwargs.items():
+            try:
+                if attr not in indexed_fields:
+                    raise TypeError
+                candidate_sets.append(attributes.get(attr, {}).get(value, {}))
+            except TypeError:  # not indexed or unhashable value
+                unindexed[attr] = value
+
+        candidate_ranges = []
+        unindexed_bounds = {}
+        for attr, (low, high) in bounds.items():
+            if attr in indexed_fields and attr in RANGE_FIELDS:
+                entries = sorted_attributes.get(attr) or SortedBlocks()
+                start, end = _range_slice(entries, low, high)
+                candidate_ranges.append((entries.count(start, end), attr, entries, start, end))
+            else:
+                unindexed_bounds[attr] = (low, high)
+
+        # Start from the smallest candidate set, every other condition is checked against it
+        candidate_sets.sort(key=len)
+        candidate_ranges.sort(key=lambda candidate: candidate[0])
+        if candidate_ranges and (not candidate_sets or candidate_ranges[0][0] < len(candidate_sets[0])):
+            _, _, entries, start, end = candidate_ranges.pop(0)
+            candidates = [sku for _, sku in entries.between(start, end)]
+        elif candidate_sets:
+            candidates = candidate_sets.pop(0)
+        else:
+            candidates = self.class_index.get(part_type, {})
+        for _, attr, _, _, _ in candidate_ranges:
+            unindexed_bounds[attr] = bounds[attr]
+
+        selected = []
+        for sku in candidates:
+            if all(sku in other for other in candidate_sets):
+                part = self.inventory[sku]["part"]
+                if all(getattr(part, attr) == value for attr, value in unindexed.items()) and \
+                        all(_in_bounds(getattr(part, attr), low, high) for attr, (low, high) in unindexed_bounds.items()):
+                    selected.append(sku)
+        return selected
+
+    # New parts start out of stock, without that counting as running out
+    def _count_added(self, sku: int, part: Part):
+        part_type = type(part)
+        self.class_totals[part_type] += 0
+        self.out_of_stock[sku] = None
+        self.class_out_of_stock[part_type] += 1
+
+    def _count_removed(self, sku: int, part: Part, quantity: int):
+        part_type = type(part)
+        self.class_totals[part_type] -= quantity
+        if self.out_of_stock.pop(sku, 0) is None:
+            self.class_out_of_stock[part_type] -= 1
+        self.stockout_events.pop(sku, None)
+        if self.ledger is not None:
+            self.ledger.forget(sku)
+
+    def _count_quantity(self, sku: int, part: Part, old: int, new: int):
+        part_type = type(part)
+        self.class_totals[part_type] += new - old
+        if new == 0 and old > 0:
+            self.out_of_stock[sku] = None
+            self.class_out_of_stock[part_type] += 1
+            self._count_stockouts(sku, part, 1)
+        elif new > 0 and old == 0:
+            del self.out_of_stock[sku]
+            self.class_out_of_stock[part_type] -= 1
+
+    def _count_stockouts(self, sku: int, part: Part, count: int):
+        self.stockout_events[sku] = self.stockout_events.get(sku, 0) + count
+        self.class_stockout_events[type(part)] += count
 
-    def add_part(self, sku: int, part: Part):
+    # Bookkeeping for a quantity change: statistics, the part's last updated time and the ledger
+    def _record_movement(self, sku: int, entry: Dict[str, Part], quantity: int):
+        now = datetime.now()
+        if self.ledger is not None:  # first, a movement the ledger rejects leaves the stock untouched
+            self.ledger.record(sku, quantity - entry["quantity"], quantity, now)
+        self._count_quantity(sku, entry["part"], entry["quantity"], quantity)
+        entry["part"].update = now
+
+    # Every failed operation ends up here
+    def _fail(self, op: str, message: str, error: Exception):
+        self.last_error = error
+        if self.metrics is not None:
+            self.metrics.record_error(op, error)
+        if self.error_mode == "raise":
+            raise error
+        if self.error_mode == "print":
+            print(f"{message}: {error}")
+
+    # Search cache hits and misses, plus call counts, error causes and latency percentiles per operation when instrumented
+    def stats(self) -> Dict[str, object]:
+        stats = self.metrics.stats() if self.metrics is not None else {}
+        stats["search_cache"] = self.search_cache_stats()
+        return stats
+
+    # Every quantity change ends up here once it has been validated
+    def _store_quantity(self, sku: int, quantity: int):
+        entry = self.inventory[sku]
+        self._record_movement(sku, entry, quantity)
+        entry["quantity"] = quantity
+
+    def add_part(self, sku: int, part: Part) -> bool:
         try:
             if len(self.inventory) >= self.max_limit:
-                raise ValueError("Maximum number of parts reached (1 million). Cannot add more parts.")
+                raise CapacityError("Maximum number of parts reached (1 million). Cannot add more parts.")
             if sku in self.inventory:
-                raise ValueError(f"SKU {sku} already exists.")
+                raise DuplicateSkuError(f"SKU {sku} already exists.")
             self.inventory[sku] = {"part": part, "quantity": 0}
+            self._index_part(sku, part)
+            self._count_added(sku, part)
+            return True
         except ValueError as e:
-            print(f"Error adding part with SKU {sku}: {e}")
+            self._fail("add_part", f"Error adding part with SKU {sku}", e)
+            return False
 
-    def add_inventory(self, sku: int, quantity: int):
+    def add_inventory(self, sku: int, quantity: int) -> bool:
         try:
             if sku < 0:
-                raise ValueError("Value cannot be less than 0")
+                raise InvalidArgumentError("Value cannot be less than 0")
             if sku not in self.inventory:
-                raise ValueError(f"SKU {sku} does not exist.")
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
             
             current_quantity = self.inventory[sku]["quantity"]
             new_quantity = current_quantity + quantity
 
             if new_quantity < 0:
-                raise ValueError("Quantity cannot go below 0")
+                raise InsufficientStockError("Quantity cannot go below 0")
 
-            self.inventory[sku]["quantity"] = new_quantity
+            self._store_quantity(sku, new_quantity)
 
-            if new_quantity == 0:
+            if new_quantity == 0 and self.error_mode == "print":
                 print(f"SKU {sku} is now out of stock.")
+            return True
         except ValueError as e:
-            print(f"Error adding inventory for part with SKU {sku}: {e}")
+            self._fail("add_inventory", f"Error adding inventory for part with SKU {sku}", e)
+            return False
+
+    # Row errors add_parts_bulk would report for these SKUs if there is room for `room` more parts
+    def _check_parts(self, skus: List[int], room: int) -> Dict[int, Tuple[int, str]]:
+        inventory = self.inventory
+        errors = {}
+        seen = set()
+        for row, sku in enumerate(skus):
+            if sku in inventory:
+                errors[row] = (sku, f"SKU {sku} already exists.")
+            elif sku in seen:
+                errors[row] = (sku, f"SKU {sku} appears more than once in the batch.")
+            elif len(seen) >= room:
+                errors[row] = (sku, "Maximum number of parts reached (1 million). Cannot add more parts.")
+            else:
+                seen.add(sku)
+        return errors
+
+    # Adds many parts at once, the whole batch is rejected if any row breaks the max_limit or duplicate SKU rules.
+    # With quantities the parts come in already stocked, as when loading stored stock, and keep their update time.
+    # Returns {"applied": bool, "total": rows, "errors": {row: (sku, message)}}
+    def add_parts_bulk(self, skus: Iterable[int], parts: Iterable[Part], quantities: Optional[Iterable[int]] = None) -> Dict[str, object]:
+        skus = _as_list(skus)
+        parts = _as_list(parts)
+        quantities = _as_list(quantities) if quantities is not None else None
+        errors = {}
+        if len(skus) != len(parts):
+            errors[min(len(skus), len(parts))] = (None, f"Got {len(skus)} SKUs for {len(parts)} parts.")
+            return {"applied": False, "total": max(len(skus), len(parts)), "errors": errors}
+        if quantities is not None and len(quantities) != len(skus):
+            errors[min(len(skus), len(quantities))] = (None, f"Got {len(skus)} SKUs for {len(quantities)} quantities.")
+            return {"applied": False, "total": max(len(skus), len(quantities)), "errors": errors}
+
+        errors = self._check_parts(skus, self.max_limit - len(self.inventory))
+        if quantities is not None:
+            errors.update((row, (sku, "Quantity cannot go below 0")) for row, (sku, quantity) in enumerate(zip(skus, quantities))
+                          if quantity < 0 and row not in errors)
+            errors = dict(sorted(errors.items()))
+        if not errors:
+            inventory = self.inventory
+            pending = {}
+            for sku, part in zip(skus, parts):
+                inventory[sku] = {"part": part, "quantity": 0}
+                self._index_part(sku, part, pending)
+                self._count_added(sku, part)
+            for entries, keys in pending.values():
+                entries.update(keys)
+            if quantities is not None:
+                self._store_quantities({sku: quantity for sku, quantity in zip(skus, quantities) if quantity}, {}, None)
+        return {"applied": not errors, "total": len(skus), "errors": errors}
+
+    # Validates a batch of quantity changes against running totals so nothing is written until the whole batch
+    # is known to be good. Returns the row errors, the final quantity per SKU and how often each SKU reaches 0.
+    def _check_adjustments(self, skus: List[int], deltas: List[int]) -> Tuple[Dict[int, Tuple[int, str]], Dict[int, int], Dict[int, int]]:
+        inventory = self.inventory
+        errors = {}
+        pending = {}
+        stockouts = {}  # SKU -> times it reaches 0 within the batch
+        for row, (sku, delta) in enumerate(zip(skus, deltas)):
+            current = pending.get(sku)
+            if current is None:
+                entry = inventory.get(sku)
+                if entry is None or sku < 0:
+                    errors[row] = (sku, "Value cannot be less than 0" if sku < 0 else f"SKU {sku} does not exist.")
+                    continue
+                current = entry["quantity"]
+            previous = current
+            current += delta
+            if current < 0:
+                errors[row] = (sku, "Quantity cannot go below 0")
+                continue
+            if self.ledger is not None and not self.ledger.fits(current - previous, current):
+                errors[row] = (sku, f"Quantity {current} is too large for the stock ledger")
+                continue
+            if current == 0 and previous > 0:
+                stockouts[sku] = stockouts.get(sku, 0) + 1
+            pending[sku] = current
+        return errors, pending, stockouts
+
+    # Applies many quantity changes at once, several deltas for the same SKU are applied in order.
+    # The whole batch is rejected if any row names a missing SKU, takes a quantity below 0 or, with a ledger
+    # attached, takes a quantity above what the ledger holds.
+    # Returns {"applied": bool, "total": rows, "errors": {row: (sku, message)}, "out_of_stock": [sku, ...]}
+    def apply_adjustments(self, skus: Iterable[int], deltas: Iterable[int]) -> Dict[str, object]:
+        skus = _as_list(skus)
+        deltas = _as_list(deltas)
+        errors = {}
+        if len(skus) != len(deltas):
+            errors[min(len(skus), len(deltas))] = (None, f"Got {len(skus)} SKUs for {len(deltas)} deltas.")
+            return {"applied": False, "total": max(len(skus), len(deltas)), "errors": errors, "out_of_stock": []}
+
+        errors, pending, stockouts = self._check_adjustments(skus, deltas)
+        out_of_stock = self._store_quantities(pending, stockouts, datetime.now()) if not errors else []
+        return {"applied": not errors, "total": len(skus), "errors": errors, "out_of_stock": out_of_stock}
+
+    # Writes the final quantities of a checked batch in one pass, with the statistics updated inline and one time
+    # stamped on every part. With when=None the parts keep their update time and the ledger is left alone, for
+    # loading stored stock. stockouts holds how often each SKU reached 0 within the batch. Returns the SKUs now at 0.
+    def _store_quantities(self, quantities: Dict[int, int], stockouts: Dict[int, int], when: Optional[datetime]) -> List[int]:
+        inventory = self.inventory
+        class_totals = self.class_totals
+        out_of_stock = self.out_of_stock
+        ledger = self.ledger if when is not None else None
+        emptied = []
+        for sku in sorted(quantities):  # SKU order visits the entries roughly in the order they were stored
+            quantity = quantities[sku]
+            entry = inventory[sku]
+            part = entry["part"]
+            old = entry["quantity"]
+            if ledger is not None:
+                ledger.record(sku, quantity - old, quantity, when)
+            part_type = type(part)
+            class_totals[part_type] += quantity - old
+            if quantity == 0:
+                emptied.append(sku)
+                if old > 0:
+                    out_of_stock[sku] = None
+                    self.class_out_of_stock[part_type] += 1
+            elif old == 0:
+                del out_of_stock[sku]
+                self.class_out_of_stock[part_type] -= 1
+            if sku in stockouts:
+                self._count_stockouts(sku, part, stockouts[sku])
+            if when is not None:
+                part.update = when
+            if self.replace_entries:
+                inventory[sku] = {"part": part, "quantity": quantity}
+            else:
+                entry["quantity"] = quantity
+        return emptied
 
     def get_quantity(self, sku: int) -> int:
         try:
             if sku not in self.inventory:
-                raise ValueError(f"SKU {sku} does not exist.")
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
             return self.inventory[sku]["quantity"]
         except ValueError as e:
-            print(f"Error getting quantity for part with SKU {sku}: {e}")
+            self._fail("get_quantity", f"Error getting quantity for part with SKU {sku}", e)
             return 0
 
     def get_inventory(self) -> List[Tuple[int, Dict[str, Part]]]:
         try:
             return [(sku, data) for sku, data in self.inventory.items()]
         except Exception as e:
-            print(f"Error getting inventory: {e}")
+            self._fail("get_inventory", "Error getting inventory", e)
             return []
 
+    # Total quantity in stock per part class
+    def usage_totals(self) -> Dict[type, int]:
+        return {part_type: total for part_type, total in self.class_totals.items() if self.class_index[part_type]}
+
+    # Number of SKUs currently at quantity 0 per part class
+    def out_of_stock_counts(self) -> Dict[type, int]:
+        return {part_type: count for part_type, count in self.class_out_of_stock.items() if self.class_index[part_type]}
+
+    # Number of times SKUs of each part class went from in stock to out of stock
+    def stockout_event_counts(self) -> Dict[type, int]:
+        return {part_type: count for part_type, count in self.class_stockout_events.items() if count}
+
+    def get_stockout_events(self, sku: int) -> int:
+        return self.stockout_events.get(sku, 0)
+
+    # Consumption rate, days until stock-out and reorder point per SKU as NumPy arrays, needs a ledger:
+    # inventory.ledger = StockLedger() before the stock movements to forecast from
+    def reorder_report(self, lead_time_days: float = 7, safety_days: float = 3) -> Dict[str, object]:
+        try:
+            if self.ledger is None:
+                raise InvalidArgumentError("No stock ledger attached to the inventory.")
+            return self.ledger.reorder_report(lead_time_days, safety_days)
+        except ValueError as e:
+            self._fail("reorder_report", "Error building reorder report", e)
+            return {}
+
+    # Yields (sku, data) pairs one at a time instead of building a list, optionally only for one part class
+    # (a PART_CLASSES key) and for quantities within inclusive bounds. An unknown part class fails when
+    # iter_inventory is called, through the error modes, and yields nothing.
+    def iter_inventory(self, part_class: Optional[str] = None, min_quantity: Optional[int] = None,
+                       max_quantity: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Part]]]:
+        if part_class is not None and part_class not in PART_CLASSES:
+            self._fail("iter_inventory", "Error getting inventory", InvalidArgumentError(f"Invalid part class: {part_class}"))
+            return iter(())
+        return self._iter_entries(part_class, min_quantity, max_quantity)
+
+    def _iter_entries(self, part_class: Optional[str], min_quantity: Optional[int],
+                      max_quantity: Optional[int]) -> Iterator[Tuple[int, Dict[str, Part]]]:
+        if part_class is None:
+            entries = self.inventory.items()
+        else:
+            part_type = PART_CLASSES[part_class]
+            entries = ((sku, self.inventory[sku]) for indexed_type in list(self.class_index)
+                       if issubclass(indexed_type, part_type) for sku in self.class_index[indexed_type])
+        if min_quantity is None and max_quantity is None:
+            yield from entries
+            return
+        for sku, data in entries:
+            if _in_bounds(data["quantity"], min_quantity, max_quantity):
+                yield sku, data
+
+    # One page of (sku, data) rows and the cursor of the next page, None after the last page. Rows come in
+    # SKU order, or in the order the parts were added (the order of get_inventory) with order_by_sku=False.
+    # A cursor marks where the last page ended rather than counting rows, so parts added or deleted between
+    # pages never make a page repeat or skip any of the others, and every page costs O(log n + limit).
+    def list_inventory(self, cursor: Optional[int] = None, limit: int = 50,
+                       order_by_sku: bool = True) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        try:
+            if not 0 < limit <= self.max_page:
+                raise InvalidArgumentError(f"Page size must be between 1 and {self.max_page}.")
+            return self._page_by_sku(cursor, limit) if order_by_sku else self._page_by_insertion(cursor, limit)
+        except ValueError as e:
+            self._fail("list_inventory", "Error listing inventory", e)
+            return [], None
+
+    # The cursor is the last SKU handed out
+    def _page_by_sku(self, cursor: Optional[int], limit: int) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        skus, more = self.sku_index.page(cursor, limit)
+        return [(sku, self.inventory[sku]) for sku in skus], skus[-1] if more else None
+
+    # The cursor is the sequence number of the last row handed out
+    def _page_by_insertion(self, cursor: Optional[int], limit: int) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        i = 0 if cursor is None else bisect_right(self.insertion_sequences, cursor)
+        rows = []
+        while i < len(self.insertion_log) and len(rows) < limit:
+            if self._is_current(i):
+                rows.append((self.insertion_log[i], self.inventory[self.insertion_log[i]]))
+            i += 1
+        last = i - 1
+        while i < len(self.insertion_log) and not self._is_current(i):
+            i += 1
+        return rows, self.insertion_sequences[last] if i < len(self.insertion_log) else None
+
     def get_part(self, sku: int) -> Part:
         try:
             if sku not in self.inventory:
-                raise ValueError(f"SKU {sku} does not exist.")
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
             return self.inventory[sku]["part"]
         except ValueError as e:
-            print(f"Error getting part with SKU {sku}: {e}")
+            self._fail("get_part", f"Error getting part with SKU {sku}", e)
             return None
 
-    def search(self, part_class: str, **kwargs) -> List[Part]:
+    # Parts of part_type and its subclasses that match
+    def _collect(self, part_type: type, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> List[Part]:
+        results = []
+        for indexed_type in list(self.class_index):
+            if issubclass(indexed_type, part_type):
+                results.extend(self.inventory[sku]["part"] for sku in self._select(indexed_type, bounds, kwargs))
+        return results
+
+    def _search(self, op: str, part_class: str, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> List[Part]:
         try:
             if part_class not in PART_CLASSES:
-                raise ValueError(f"Invalid part class: {part_class}")
-            
+                raise InvalidArgumentError(f"Invalid part class: {part_class}")
+
             part_type = PART_CLASSES[part_class]
+            _check_fields(part_type, [*bounds, *kwargs])
 
-            return [part["part"] for part in self.inventory.values() if isinstance(part["part"], part_type) and all(getattr(part["part"], attr) == value for attr, value in kwargs.items())]
+            key = _search_key(part_class, bounds, kwargs)
+            cached = self._cache_get(key, part_type)
+            if cached is not None:
+                return list(cached)
+            version = self.class_versions[part_type]  # read first, a part added meanwhile makes the entry stale
+            results = self._collect(part_type, bounds, kwargs)
+            self._cache_put(key, version, results)
+            return results
         except Exception as e:
-            print(f"Error searching for part: {e}")
+            self._fail(op, "Error searching for part", e)
             return []
 
+    def search(self, part_class: str, **kwargs) -> List[Part]:
+        return self._search("search", part_class, {}, kwargs)
 
-    def delete_part(self, sku: int):
+    # Search with inclusive (low, high) bounds per attribute, either bound may be None, e.g. {"gauge": (22, 26), "length": (50, None)}
+    def search_range(self, part_class: str, bounds: Dict[str, Tuple[Optional[float], Optional[float]]], **kwargs) -> List[Part]:
+        return self._search("search_range", part_class, bounds, kwargs)
+
+    # Search for parts whose attribute is within a percentage of a value, e.g. resistors within 5% of 4700 ohms
+    def search_tolerance(self, part_class: str, attr: str, value: float, percent: float, **kwargs) -> List[Part]:
+        margin = abs(value) * percent / 100
+        # Through the class so an instrumented inventory counts this call once, as search_tolerance
+        return type(self).search_range(self, part_class, {attr: (value - margin, value + margin)}, **kwargs)
+
+    # Find the part whose attribute is closest to a value, direction "above" only allows values >= value,
+    # "below" only values <= value, e.g. the shortest HDMI cable that is at least 6 ft:
+    # search_nearest("4", "length", 6, "above", cable_type=DisplayCableType.hdmi)
+    def search_nearest(self, part_class: str, attr: str, value: float, direction: str = "nearest", **kwargs) -> Optional[Part]:
         try:
-            del self.inventory[sku]
-        except KeyError as e:
-            print(f"Error deleting part with SKU {sku}: {e}")
+            if part_class not in PART_CLASSES:
+                raise InvalidArgumentError(f"Invalid part class: {part_class}")
+            if direction not in ("nearest", "above", "below"):
+                raise InvalidArgumentError(f"Invalid direction: {direction}")
+
+            part_type = PART_CLASSES[part_class]
+            _check_fields(part_type, [attr, *kwargs])
+
+            def matches(sku):
+                part = self.inventory[sku]["part"]
+                return all(getattr(part, name) == wanted for name, wanted in kwargs.items())
+
+            best = None  # (distance, value, part)
+            for indexed_type in list(self.class_index):
+                if not issubclass(indexed_type, part_type):
+                    continue
+
+                if attr not in RANGE_FIELDS or attr not in PART_FIELDS.get(indexed_type, ()):
+                    # No sorted index for this attribute, check every candidate
+                    for sku in self._select(indexed_type, {}, kwargs):
+                        candidate = getattr(self.inventory[sku]["part"], attr)
+                        if (direction == "above" and candidate < value) or (direction == "below" and candidate > value):
+                            continue
+                        if best is None or abs(candidate - value) < best[0]:
+                            best = (abs(candidate - value), candidate, self.inventory[sku]["part"])
+                    continue
+
+                # Walk outwards from the insertion point until the first match on each side
+                entries = self.sorted_index.get(indexed_type, {}).get(attr) or SortedBlocks()
+                if direction != "below":
+                    for candidate, sku in entries.forward(entries.position((value,))):
+                        if matches(sku):
+                            if best is None or candidate - value < best[0]:
+                                best = (candidate - value, candidate, self.inventory[sku]["part"])
+                            break
+                if direction != "above":
+                    k = entries.position((value, float("inf")), right=True) if direction == "below" else entries.position((value,))
+                    for candidate, sku in entries.backward(k):
+                        if matches(sku):
+                            if best is None or value - candidate < best[0]:
+                                best = (value - candidate, candidate, self.inventory[sku]["part"])
+                            break
+            return best[2] if best is not None else None
+        except Exception as e:
+            self._fail("search_nearest", "Error searching for part", e)
+            return None
+
+
+    def delete_part(self, sku: int) -> bool:
+        try:
+            if sku not in self.inventory:
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
+            entry = self.inventory.pop(sku)
+            self._unindex_part(sku, entry["part"])
+            self._count_removed(sku, entry["part"], entry["quantity"])
+            return True
+        except ValueError as e:
+            self._fail("delete_part", f"Error deleting part with SKU {sku}", e)
+            return False
 
 # main class
 if __name__ == "__main__":
-    inventory = Inventory()
+    # Stock is kept in inventory_data between runs. Register this script under its module name
+    # first so the persistence module shares its part classes instead of importing a second copy.
+    import sys
+    sys.modules.setdefault("MIL_Summer_App", sys.modules[__name__])
+    from inventory_persistence import PersistentInventory
+    inventory = PersistentInventory("inventory_data")
 
 # Display menu options to the user
     while True:
@@ -244,29 +1033,15 @@ if __name__ == "__main__":
             sku = int(input("Enter SKU: "))
             print("Quantity:", inventory.get_quantity(sku))
 
-        elif choice == "4":            # Get the entire inventory with details of each part
+        elif choice == "4":            # Page through the inventory with details of each part, in SKU order
             print("Inventory:")
-            for sku, item in inventory.get_inventory():
-                part = item['part']
-                quantity = item['quantity']
-                part_name = ""
-                part_characteristics = ""
-                if isinstance(part, Resistor):
-                    part_name = "Resistor"
-                    part_characteristics = f"Resistance: {part.resistance} ohms, Tolerance: {part.tolerance}%"
-                elif isinstance(part, Solder):
-                    part_name = "Solder"
-                    part_characteristics = f"Type: {part.solder_type.value}, Length: {part.length} ft"
-                elif isinstance(part, Wire):
-                    part_name = "Wire"
-                    part_characteristics = f"Gauge: {part.gauge}, Length: {part.length} ft"
-                elif isinstance(part, DisplayCable):
-                    part_name = "Display Cable"
-                    part_characteristics = f"Type: {part.cable_type.value}, Length: {part.length} ft, Color: {part.color}"
-                elif isinstance(part, EthernetCable):
-                    part_name = "Ethernet Cable"
-                    part_characteristics = f"Alpha Type: {part.alpha_type.value}, Beta Type: {part.beta_type.value}, Speed: {part.ether_speed.value}, Length: {part.length} ft"
-                print(f"SKU: {sku}, Part: {part_name}, Characteristics: {part_characteristics}, Quantity: {quantity}")
+            cursor = None
+            while True:
+                rows, cursor = inventory.list_inventory(cursor, 20)
+                for sku, item in rows:
+                    print(format_row(sku, item))
+                if cursor is None or input("Press Enter for more, q to stop: ").strip().lower() == "q":
+                    break
 
         elif choice == "5":            # Search for a specific part based on user-provided attributes
             part_class = input("Enter part class (1. Resistor, 2. Solder, 3. Wire, 4. Display Cable, 5. Ethernet Cable): ")
@@ -303,51 +1078,13 @@ if __name__ == "__main__":
             print("Part deleted")
 
         elif choice == "8":            # Exit the program
+            inventory.close()
             break
 
         elif choice == "7":             # Show graphs related to part usage and out-of-stock occurrences
-
-            # Count the usage of each part
-            usage_count = defaultdict(int)
-            for sku, item in inventory.get_inventory():
-                usage_count[type(item['part'])] += item['quantity']
-
-            # Sort parts by usage count
-            sorted_parts_by_usage = sorted(usage_count.items(), key=lambda x: x[1], reverse=True)
-
-            # Plot the usage count of each part
-            plt.figure(figsize=(12, 6))
-            plt.bar(range(len(sorted_parts_by_usage)), [count for part, count in sorted_parts_by_usage], align='center', alpha=0.5)
-            plt.xticks(range(len(sorted_parts_by_usage)), [part.__name__ for part, count in sorted_parts_by_usage], rotation=45)
-            plt.xlabel('Parts')
-            plt.ylabel('Usage Count')
-            plt.title('Usage Count of Parts')
-            plt.tight_layout()
-            plt.show()
-
-            # Check which parts commonly fall out of stock
-            out_of_stock_parts = []
-            for sku, item in inventory.get_inventory():
-                if item['quantity'] == 0:
-                    out_of_stock_parts.append(type(item['part']).__name__)
-
-            # Count the occurrence of each out-of-stock part
-            out_of_stock_count = defaultdict(int)
-            for part_name in out_of_stock_parts:
-                out_of_stock_count[part_name] += 1
-
-            # Sort parts by the number of times they fall out of stock
-            sorted_parts_by_out_of_stock = sorted(out_of_stock_count.items(), key=lambda x: x[1], reverse=True)
-
-            # Plot the occurrence count of each out-of-stock part
-            plt.figure(figsize=(12, 6))
-            plt.bar(range(len(sorted_parts_by_out_of_stock)), [count for part, count in sorted_parts_by_out_of_stock], align='center', alpha=0.5)
-            plt.xticks(range(len(sorted_parts_by_out_of_stock)), [part for part, count in sorted_parts_by_out_of_stock], rotation=45)
-            plt.xlabel('Parts')
-            plt.ylabel('Occurrence Count')
-            plt.title('Number of Times Parts Fall Out of Stock')
-            plt.tight_layout()
-            plt.show()
+            # matplotlib is only loaded the first time the charts are shown
+            from inventory_report import show_charts
+            show_charts(inventory)
 
         else:
             print("Invalid choice. Please try again.")
@@ -1,96 +1,344 @@
-from datetime import datetime
-from MIL_Summer_App import Inventory, Resistor, Solder, Wire, DisplayCable, EthernetCable, SolderType, DisplayCableType, EthernetCableAlphaType, EthernetCableBetaType, EthernetCableSpeed
-import matplotlib.pyplot as plt
-from collections import defaultdict
-
-inventory = Inventory()
-
-# Add a few parts
-inventory.add_part(1001, Resistor(datetime.now(), 100, 5))
-inventory.add_part(1002, Solder(datetime.now(), SolderType.lead, 50))
-inventory.add_part(1003, Wire(datetime.now(), 24, 100))
-inventory.add_part(1004, DisplayCable(datetime.now(), DisplayCableType.hdmi, 10, 'black'))
-inventory.add_part(1005, EthernetCable(datetime.now(), EthernetCableAlphaType.male, EthernetCableBetaType.female, EthernetCableSpeed.speed_1GBPS, 50))
-
-# Add more parts
-inventory.add_part(1006, Resistor(datetime.now(), 220, 10))
-inventory.add_part(1007, Solder(datetime.now(), SolderType.lead_free, 100))
-inventory.add_part(1008, Wire(datetime.now(), 26, 50))
-inventory.add_part(1009, DisplayCable(datetime.now(), DisplayCableType.vga, 6, 'blue'))
-inventory.add_part(1010, EthernetCable(datetime.now(), EthernetCableAlphaType.female, EthernetCableBetaType.male, EthernetCableSpeed.speed_100MBPS, 25))
-
-# Add inventory
-inventory.add_inventory(1001, 10)
-inventory.add_inventory(1002, 20)
-inventory.add_inventory(1003, 30)
-inventory.add_inventory(1004, 5)
-inventory.add_inventory(1005, 15)
-inventory.add_inventory(1006, 0)  # Set quantity to 0 to simulate out-of-stock
-inventory.add_inventory(1007, 0)
-inventory.add_inventory(1008, 0)
-inventory.add_inventory(1009, 0)
-inventory.add_inventory(1010, 0)
-
-# Show the final inventory
-print("\nFinal Inventory:")
-for sku, item in inventory.get_inventory():
-    part = item['part']
-    quantity = item['quantity']
-    part_name = ""
-    part_characteristics = ""
-    update_date = part.update.strftime("%Y-%m-%d %H:%M:%S")  # Format the update date and time
-
-    if isinstance(part, Resistor):
-        part_name = "Resistor"
-        part_characteristics = f"Resistance: {part.resistance} ohms, Tolerance: {part.tolerance}%"
-    elif isinstance(part, Solder):
-        part_name = "Solder"
-        part_characteristics = f"Type: {part.solder_type.value}, Length: {part.length} ft"
-    elif isinstance(part, Wire):
-        part_name = "Wire"
-        part_characteristics = f"Gauge: {part.gauge}, Length: {part.length} ft"
-    elif isinstance(part, DisplayCable):
-        part_name = "Display Cable"
-        part_characteristics = f"Type: {part.cable_type.value}, Length: {part.length} ft, Color: {part.color}"
-    elif isinstance(part, EthernetCable):
-        part_name = "Ethernet Cable"
-        part_characteristics = f"Alpha Type: {part.alpha_type.value}, Beta Type: {part.beta_type.value}, Speed: {part.ether_speed.value}, Length: {part.length} ft"
-    print(f"SKU: {sku}, Part: {part_name}, Characteristics: {part_characteristics}, Quantity: {quantity}, Last Updated: {update_date}")
-
-
-# Display the usage count graph
-usage_count = defaultdict(int)
-for sku, item in inventory.get_inventory():
-    usage_count[type(item['part'])] += item['quantity']
-
-sorted_parts_by_usage = sorted(usage_count.items(), key=lambda x: x[1], reverse=True)
-
-plt.figure(figsize=(12, 6))
-plt.bar(range(len(sorted_parts_by_usage)), [count for part, count in sorted_parts_by_usage], align='center', alpha=0.5)
-plt.xticks(range(len(sorted_parts_by_usage)), [part.__name__ for part, count in sorted_parts_by_usage], rotation=45)
-plt.xlabel('Parts')
-plt.ylabel('Usage Count')
-plt.title('Usage Count of Parts')
-plt.tight_layout()
-plt.show()
-
-# Display the out-of-stock count graph
-out_of_stock_parts = []
-for sku, item in inventory.get_inventory():
-    if item['quantity'] == 0:
-        out_of_stock_parts.append(type(item['part']).__name__)
-
-out_of_stock_count = defaultdict(int)
-for part_name in out_of_stock_parts:
-    out_of_stock_count[part_name] += 1
-
-sorted_parts_by_out_of_stock = sorted(out_of_stock_count.items(), key=lambda x: x[1], reverse=True)
-
-plt.figure(figsize=(12, 6))
-plt.bar(range(len(sorted_parts_by_out_of_stock)), [count for part, count in sorted_parts_by_out_of_stock], align='center', alpha=0.5)
-plt.xticks(range(len(sorted_parts_by_out_of_stock)), [part for part, count in sorted_parts_by_out_of_stock], rotation=45)
-plt.xlabel('Parts')
-plt.ylabel('Occurrence Count')
-plt.title('Number of Times Parts Fall Out of Stock')
-plt.tight_layout()
-plt.show()
+from datetime import datetime, timedelta
+from MIL_Summer_App import Inventory, format_part, format_row, part_to_dict, Resistor, Solder, Wire, DisplayCable, EthernetCable, SolderType, DisplayCableType, EthernetCableAlphaType, EthernetCableBetaType, EthernetCableSpeed, InsufficientStockError, SkuNotFoundError, InvalidArgumentError
+from columnar_inventory import ColumnarInventory
+from concurrent_inventory import ConcurrentInventory
+from inventory_io import export_csv, export_jsonl, import_csv, import_jsonl
+from inventory_metrics import instrument, print_exporter
+from inventory_persistence import PersistentInventory
+from inventory_snapshot import MappedInventory, write_snapshot
+from inventory_report import render_report, show_charts
+from sharded_inventory import ShardedInventory
+from stock_ledger import StockLedger
+import csv
+import os
+import sys
+import threading
+import tempfile
+
+# ShardedInventory's worker processes may import this file again, so the tests only run when it is executed directly
+if __name__ == "__main__":
+    inventory = Inventory()
+
+    # Add a few parts
+    inventory.add_part(1001, Resistor(datetime.now(), 100, 5))
+    inventory.add_part(1002, Solder(datetime.now(), SolderType.lead, 50))
+    inventory.add_part(1003, Wire(datetime.now(), 24, 100))
+    inventory.add_part(1004, DisplayCable(datetime.now(), DisplayCableType.hdmi, 10, 'black'))
+    inventory.add_part(1005, EthernetCable(datetime.now(), EthernetCableAlphaType.male, EthernetCableBetaType.female, EthernetCableSpeed.speed_1GBPS, 50))
+
+    # Add more parts
+    inventory.add_part(1006, Resistor(datetime.now(), 220, 10))
+    inventory.add_part(1007, Solder(datetime.now(), SolderType.lead_free, 100))
+    inventory.add_part(1008, Wire(datetime.now(), 26, 50))
+    inventory.add_part(1009, DisplayCable(datetime.now(), DisplayCableType.vga, 6, 'blue'))
+    inventory.add_part(1010, EthernetCable(datetime.now(), EthernetCableAlphaType.female, EthernetCableBetaType.male, EthernetCableSpeed.speed_100MBPS, 25))
+
+    # Add inventory
+    inventory.add_inventory(1001, 10)
+    inventory.add_inventory(1002, 20)
+    inventory.add_inventory(1003, 30)
+    inventory.add_inventory(1004, 5)
+    inventory.add_inventory(1005, 15)
+    inventory.add_inventory(1006, 0)  # Set quantity to 0 to simulate out-of-stock
+    inventory.add_inventory(1007, 0)
+    inventory.add_inventory(1008, 0)
+    inventory.add_inventory(1009, 0)
+    inventory.add_inventory(1010, 0)
+
+    # Sell out some parts so they register as running out of stock
+    inventory.add_inventory(1001, -10)
+    inventory.add_inventory(1006, 4)
+    inventory.add_inventory(1006, -4)
+    inventory.add_inventory(1006, 2)
+    inventory.add_inventory(1006, -2)
+    inventory.add_inventory(1008, 7)
+    inventory.add_inventory(1008, -7)
+
+    # Show the final inventory a page at a time
+    print("\nFinal Inventory:")
+    cursor = None
+    while True:
+        rows, cursor = inventory.list_inventory(cursor, limit=4)
+        for sku, item in rows:
+            update_date = item['part'].update.strftime("%Y-%m-%d %H:%M:%S")  # Format the update date and time
+            print(f"{format_row(sku, item)}, Last Updated: {update_date}")
+        if cursor is None:
+            break
+
+    # Cursors survive parts being added and deleted between pages: nothing that was there all along is repeated or skipped
+    paged_inventory = Inventory()
+    for sku in range(10, 100, 10):
+        paged_inventory.add_part(sku, Wire(datetime.now(), 22, sku))
+    rows, cursor = paged_inventory.list_inventory(limit=3)
+    paged_inventory.delete_part(20)  # already listed
+    paged_inventory.delete_part(50)  # not listed yet
+    paged_inventory.add_part(5, Wire(datetime.now(), 22, 5))  # before the cursor, only a new walk shows it
+    paged_inventory.add_part(55, Wire(datetime.now(), 22, 55))
+    listed = [sku for sku, _ in rows]
+    while cursor is not None:
+        rows, cursor = paged_inventory.list_inventory(cursor, limit=3)
+        listed.extend(sku for sku, _ in rows)
+    assert listed == [10, 20, 30, 40, 55, 60, 70, 80, 90], listed
+    rows, cursor = paged_inventory.list_inventory(limit=100, order_by_sku=False)
+    assert [sku for sku, _ in rows] == [sku for sku, _ in paged_inventory.get_inventory()] == [10, 30, 40, 60, 70, 80, 90, 5, 55]
+
+
+    # Stress test concurrent stock updates, no update may be lost
+    concurrent_inventory = ConcurrentInventory()
+    for sku in range(2000, 2010):
+        concurrent_inventory.add_part(sku, Wire(datetime.now(), 22, 10))
+
+    def post_updates(worker):
+        for i in range(20000):
+            sku = 2000 + (i + worker) % 10
+            concurrent_inventory.add_inventory(sku, 1)
+            while True:  # take one back again through compare-and-adjust
+                current = concurrent_inventory.get_quantity(sku)
+                if current > 0 and concurrent_inventory.compare_and_adjust(sku, current, -1):
+                    break
+            concurrent_inventory.add_inventory(sku, 2)
+
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible to provoke races
+    workers = [threading.Thread(target=post_updates, args=(worker,)) for worker in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    sys.setswitchinterval(0.005)
+
+    total = sum(concurrent_inventory.get_quantity(sku) for sku in range(2000, 2010))
+    print(f"\nConcurrent stock updates: expected {8 * 20000 * 2}, got {total}")
+    assert total == 8 * 20000 * 2, "Lost stock updates"
+
+
+    # Count and time operations, failures are raised as typed errors instead of printed
+    instrument(inventory)
+    inventory.error_mode = "raise"
+    try:
+        inventory.add_inventory(1002, -1000)
+    except InsufficientStockError as e:
+        print(f"\nRaised {type(e).__name__}: {e}")
+    try:
+        inventory.get_quantity(4242)
+    except SkuNotFoundError as e:
+        print(f"Raised {type(e).__name__}: {e}")
+    for sku in range(1001, 1011):
+        inventory.get_quantity(sku)
+    inventory.error_mode = "print"
+    print_exporter(inventory.stats())
+    assert inventory.stats()["operations"]["get_quantity"]["calls"] == 11
+    assert inventory.stats()["operations"]["add_inventory"]["error_causes"] == {"InsufficientStockError": 1}
+
+
+    # Repeated searches are answered from the cache until a part of the searched class is added or deleted
+    inventory.search("3", gauge=24)
+    inventory.search("3", gauge=24)
+    inventory.add_inventory(1003, 5)  # stock changes keep the cached result
+    assert inventory.search("3", gauge=24) == [inventory.get_part(1003)]
+    inventory.add_part(1011, Wire(datetime.now(), 24, 20))
+    assert len(inventory.search("3", gauge=24)) == 2
+    cache = inventory.stats()["search_cache"]
+    print(f"Search cache: {cache['hits']} hits, {cache['misses']} misses")
+    assert (cache["hits"], cache["misses"]) == (2, 2)
+
+    # Searching on an attribute the part class does not have is an invalid argument, not an AttributeError
+    inventory.error_mode = "raise"
+    for search in (lambda: inventory.search("3", colour="red"), lambda: inventory.search_range("3", {"width": (1, 2)}),
+                   lambda: inventory.search_nearest("3", "width", 5), lambda: inventory.search_nearest("3", "length", 5, gauge_size=24)):
+        try:
+            search()
+            raise AssertionError("unknown search attribute accepted")
+        except InvalidArgumentError as e:
+            print(f"Raised {type(e).__name__}: {e}")
+    inventory.error_mode = "print"
+
+
+    # Exported rows import back unchanged, Enum fields travel by value and the class and quantity filters pick the same rows both ways
+    def exported_rows(target, *filters):
+        return {sku: (item["quantity"], part_to_dict(item["part"])) for sku, item in target.iter_inventory(*filters)}
+
+    io_directory = tempfile.mkdtemp()
+    for export, load, name in ((export_csv, import_csv, "inventory.csv"), (export_jsonl, import_jsonl, "inventory.jsonl")):
+        path = os.path.join(io_directory, name)
+        assert export(inventory, path) == len(inventory.get_inventory())
+        copy = Inventory()
+        assert load(copy, path) == {"imported": len(inventory.get_inventory()), "errors": {}}
+        assert exported_rows(copy) == exported_rows(inventory)
+        filtered = Inventory()
+        load(filtered, path, part_class="5", max_quantity=20)
+        assert exported_rows(filtered) == exported_rows(inventory, "5", None, 20) != {}
+        assert export(inventory, path, part_class="2", min_quantity=1) == len(exported_rows(inventory, "2", 1)) > 0
+        filtered = Inventory()
+        load(filtered, path)
+        assert exported_rows(filtered) == exported_rows(inventory, "2", 1)
+    with open(os.path.join(io_directory, "inventory.csv"), newline="") as f:
+        assert next(row for row in csv.DictReader(f) if row["sku"] == "1002")["solder_type"] == str(SolderType.lead.value)
+    print(f"Exported and imported {len(inventory.get_inventory())} parts as CSV and JSON Lines")
+
+    # An unknown part class is reported when iter_inventory is called, like every other error
+    inventory.error_mode = "silent"
+    assert list(inventory.iter_inventory("9")) == [] and isinstance(inventory.last_error, InvalidArgumentError)
+    inventory.error_mode = "print"
+    assert import_jsonl(Inventory(), path, part_class="9") == {"imported": 0, "errors": {0: (None, "Invalid part class: 9")}}
+
+
+    # Stock survives closing and reopening, replayed from the log and then loaded from a snapshot
+    data_directory = tempfile.mkdtemp()
+    stored = PersistentInventory(data_directory)
+    stored.add_parts_bulk([1, 2, 3], [Resistor(datetime(2024, 1, 1), 100, 5), Wire(datetime(2024, 1, 1), 24, 100), Solder(datetime(2024, 1, 1), SolderType.lead, 50)])
+    stored.apply_adjustments([1, 2, 1, 2, 3], [5, 3, -5, 1, 2])
+    stored.add_inventory(2, -4)
+    stored.add_inventory(1, 1)
+    stored.delete_part(3)
+    saved = {sku: (item["quantity"], item["part"].update) for sku, item in stored.inventory.items()}
+    saved_stats = (stored.usage_totals(), stored.stockout_event_counts(), sorted(stored.out_of_stock))
+    stored.close()
+    for source in ("log", "snapshot"):
+        stored = PersistentInventory(data_directory)
+        assert {sku: (item["quantity"], item["part"].update) for sku, item in stored.inventory.items()} == saved
+        assert (stored.usage_totals(), stored.stockout_event_counts(), sorted(stored.out_of_stock)) == saved_stats
+        print(f"Reopened {len(saved)} parts from the {source}")
+        stored.snapshot()
+        stored.close()
+    mapped = MappedInventory(os.path.join(data_directory, "inventory.snapshot"))  # the snapshot is a binary one
+    assert {sku: mapped.get_quantity(sku) for sku in saved} == {sku: quantity for sku, (quantity, _) in saved.items()}
+    mapped.close()
+
+    # A part class the log cannot rebuild is refused before it reaches memory, so nothing is lost on reopening
+    class TrimmerResistor(Resistor):
+        pass
+
+    stored = PersistentInventory(data_directory)
+    stored.error_mode = "raise"
+    try:
+        stored.add_part(4, TrimmerResistor(datetime(2024, 1, 1), 100, 5))
+        raise AssertionError("unregistered part class accepted")
+    except InvalidArgumentError as e:
+        print(f"Raised {type(e).__name__}: {e}")
+    report = stored.add_parts_bulk([4, 5], [Resistor(datetime(2024, 1, 1), 100, 5), TrimmerResistor(datetime(2024, 1, 1), 100, 5)])
+    assert report["errors"] == {1: (5, "Unsupported part class: TrimmerResistor")} and not report["applied"]
+    assert sorted(stored.inventory) == sorted(saved)
+    stored.close()
+    assert sorted(PersistentInventory(data_directory, read_only=True).inventory) == sorted(saved)
+
+
+    # The ledger keeps the latest movements as-is, compacts older consumption into hourly and then daily buckets
+    # and forecasts from all three
+    ledger = StockLedger(ring_size=2)
+    start = datetime(2024, 1, 1)
+    for hour, delta, quantity in ((0, 100, 100), (1, -10, 90), (2, -20, 70), (3, -5, 65)):
+        ledger.record(7, delta, quantity, start + timedelta(hours=hour))
+    assert (ledger.hourly.sum(), ledger.daily.sum()) == (10, 0)  # the restock is dropped, the first sale is in its hour
+    ledger.record(7, -1, 64, start + timedelta(days=2))
+    assert (ledger.hourly.sum(), ledger.daily.sum()) == (0, 30)  # both sales have left the hourly window
+    forecast = ledger.reorder_report(lead_time_days=7, safety_days=3, now=start + timedelta(days=4))
+    assert forecast["daily_usage"].tolist() == [9.0]  # 36 units sold in 4 days
+    assert forecast["reorder_point"].tolist() == [90] and forecast["reorder"].tolist() == [True]
+
+    # Quantities beyond 32 bits are recorded, ones the ledger cannot hold are rejected before any statistic changes
+    large = Inventory()
+    large.ledger = StockLedger()
+    large.add_part(1, Resistor(datetime(2024, 1, 1), 100, 5))
+    assert large.add_inventory(1, 3_000_000_000) and large.ledger.quantity[large.ledger.rows[1]] == 3_000_000_000
+    large.error_mode = "raise"
+    before = (large.get_quantity(1), large.usage_totals(), large.out_of_stock_counts())
+    try:
+        large.add_inventory(1, 2 ** 63)
+        raise AssertionError("ledger overflow accepted")
+    except InvalidArgumentError as e:
+        print(f"Raised {type(e).__name__}: {e}")
+    assert large.apply_adjustments([1], [2 ** 63])["errors"] == {0: (1, f"Quantity {2 ** 63 + 3_000_000_000} is too large for the stock ledger")}
+    assert (large.get_quantity(1), large.usage_totals(), large.out_of_stock_counts()) == before
+
+
+    # A columnar inventory gives back every part exactly as it was added, ints stay ints and fractions stay fractions,
+    # and its searches find the same parts as a plain inventory
+    def formatted(target, skus):
+        return [format_row(sku, {"part": target.get_part(sku), "quantity": target.get_quantity(sku)}) for sku in skus]
+
+    def columnar_parts():
+        return {1: Resistor(datetime(2024, 1, 1), 4.7, 5), 2: Resistor(datetime(2024, 1, 1), 100, 0.5), 3: Wire(datetime(2024, 1, 1), 22, 10.5),
+                4: Wire(datetime(2024, 1, 1), 22.0, 10), 5: Solder(datetime(2024, 1, 1), SolderType.rosin_core, 50),
+                6: DisplayCable(datetime(2024, 1, 1), DisplayCableType.hdmi, 6, 'red')}
+
+    plain = Inventory()
+    columnar = ColumnarInventory()
+    for target in (plain, columnar):
+        for sku, part in columnar_parts().items():
+            target.add_part(sku, part)
+        target.add_inventory(3, 7)
+    assert formatted(columnar, columnar_parts()) == formatted(plain, columnar_parts())
+    for part_class, kwargs in (("1", {"resistance": 4.7}), ("1", {"tolerance": 0.5}), ("1", {"resistance": 4}), ("3", {"gauge": 22}),
+                               ("3", {"length": 10}), ("2", {"solder_type": SolderType.rosin_core}), ("4", {"color": "red"})):
+        found = [[format_part(part) for part in target.search(part_class, **kwargs)] for target in (plain, columnar)]
+        assert found[0] == found[1], kwargs
+    assert len(columnar.search("1", resistance=4.7)) == 1 and columnar.search("1", resistance=4) == []
+    columnar.error_mode = "raise"
+    try:
+        columnar.add_part(7, Resistor(datetime(2024, 1, 1), 2 ** 60 + 1, 5))
+        raise AssertionError("inexact resistance accepted")
+    except InvalidArgumentError as e:
+        print(f"Raised {type(e).__name__}: {e}")
+    assert len(columnar.get_inventory()) == len(columnar_parts())
+
+    # A binary snapshot answers like the inventory it was written from, straight from the file
+    plain.add_inventory(3, -7)
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "inventory.snap")
+    write_snapshot(plain, snapshot_path)
+    mapped = MappedInventory(snapshot_path)
+    assert formatted(mapped, columnar_parts()) == formatted(plain, columnar_parts())
+    for part_class, kwargs in (("4", {"color": "red"}), ("4", {"color": "green"}), ("2", {"solder_type": SolderType.rosin_core}),
+                               ("2", {"solder_type": SolderType.lead}), ("1", {"resistance": 4.7})):
+        found = [[format_part(part) for part in target.search(part_class, **kwargs)] for target in (plain, mapped)]
+        assert found[0] == found[1], kwargs
+    assert (mapped.get_stockout_events(3), mapped.stockout_event_counts()) == (1, plain.stockout_event_counts())
+    mapped.error_mode = "silent"
+    assert mapped.get_quantity(99) == 0 and mapped.get_part(99) is None and isinstance(mapped.last_error, SkuNotFoundError)
+    mapped.close()
+
+
+    # A sharded inventory gives the same answers as a plain one, down to the type of every value: 4.7 stays 4.7, 22 stays an int,
+    # and a resistance too large for the shared result records comes back exactly as well
+    def described(parts):
+        return sorted(format_part(part) for part in parts)
+
+    plain = Inventory()
+    sharded = ShardedInventory(shards=2)
+    for target in (plain, sharded):
+        target.add_parts_bulk(range(3000, 3040), [Wire(datetime(2024, 1, 1), 20 + sku % 5, sku % 7 * 10) if sku % 2 else Resistor(datetime(2024, 1, 1), 100 * (sku % 9 + 1), 5)
+                                                  for sku in range(3000, 3040)])
+        target.apply_adjustments([3000 + i % 40 for i in range(100)], [i % 4 + 1 for i in range(100)])
+        target.add_inventory(3003, -target.get_quantity(3003))
+        target.add_inventory(3004, -target.get_quantity(3004))
+        target.delete_part(3010)
+        target.add_part(3041, Wire(datetime(2024, 1, 1), 22, 35))
+        target.add_parts_bulk([3042, 3043, 3044], [Resistor(datetime(2024, 1, 1), 4.7, 0.5), Wire(datetime(2024, 1, 1), 22.5, 12.5),
+                                                   Resistor(datetime(2024, 1, 1), 2 ** 60 + 1, 5)])
+    assert sorted(format_row(sku, item) for sku, item in plain.get_inventory()) == sorted(format_row(sku, item) for sku, item in sharded.get_inventory())
+    for name in ("usage_totals", "out_of_stock_counts", "stockout_event_counts"):
+        assert getattr(plain, name)() == getattr(sharded, name)(), name
+    for name, args, kwargs in (("search", ("3",), {"gauge": 22}), ("search", ("1",), {"resistance": 4.7}), ("search", ("1",), {"resistance": 2 ** 60 + 1}),
+                               ("search_range", ("1", {"resistance": (200, 600)}), {}), ("search_range", ("3", {"gauge": (22, 23)}), {}),
+                               ("search_tolerance", ("1", "resistance", 500, 20), {}), ("search_range", ("3", {"length": (20, None)}), {"gauge": 21})):
+        assert described(getattr(plain, name)(*args, **kwargs)) == described(getattr(sharded, name)(*args, **kwargs)), name
+    assert format_part(plain.search_nearest("3", "length", 25, "above")) == format_part(sharded.search_nearest("3", "length", 25, "above"))
+    assert format_part(plain.search_nearest("1", "resistance", 5)) == format_part(sharded.search_nearest("1", "resistance", 5))
+    pages = {}
+    for target in (plain, sharded):
+        cursor = None
+        pages[target] = []
+        while True:
+            rows, cursor = target.list_inventory(cursor, limit=7)
+            pages[target].append([sku for sku, _ in rows])
+            if cursor is None:
+                break
+    assert pages[plain] == pages[sharded]
+    print(f"Sharded inventory matches the plain one on {len(plain.get_inventory())} SKUs")
+    sharded.close()
+
+
+    # Write the usage and out-of-stock charts to image files, then display them
+    report_directory = tempfile.mkdtemp()
+    for path in render_report(inventory.usage_totals(), inventory.stockout_event_counts(), report_directory):
+        print(f"Wrote {path}")
+    show_charts(inventory)
@@ -0,0 +1,304 @@
+from collections import defaultdict
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from MIL_Summer_App import (Inventory, Part, PART_CLASSES, PART_FIELDS, SolderType, DisplayCableType,
+                            EthernetCableAlphaType, EthernetCableBetaType, EthernetCableSpeed, to_epoch, from_epoch,
+                            SkuNotFoundError, DuplicateSkuError, CapacityError, InsufficientStockError, InvalidArgumentError)
+
+# Storage type of every part attribute: float64 for numbers, the Enum class for enum fields (stored as
+# small integer codes) and str for free text (stored as dictionary codes). Ints and floats share the float64
+# columns, a per-row bitmask (bit i for the i-th attribute in PART_FIELDS order) records which values were
+# ints so each number comes back as the type it was stored as.
+COLUMN_TYPES = {
+    "resistance": np.float64,
+    "tolerance": np.float64,
+    "gauge": np.float64,
+    "length": np.float64,
+    "solder_type": SolderType,
+    "cable_type": DisplayCableType,
+    "alpha_type": EthernetCableAlphaType,
+    "beta_type": EthernetCableBetaType,
+    "ether_speed": EthernetCableSpeed,
+    "color": str
+}
+
+# Maps attribute values to the codes stored in a column and back. Values a column cannot give back
+# exactly (ints beyond 2**53, text in a number column, a color that is not a str) raise InvalidArgumentError.
+class ColumnCodec:
+    def __init__(self, column_type):
+        self.column_type = column_type
+        if isinstance(column_type, type) and issubclass(column_type, Enum):
+            self.values = list(column_type)
+            self.dtype = np.uint8
+        elif column_type is str:
+            self.values = []
+            self.dtype = np.uint32
+        else:
+            self.values = None
+            self.dtype = column_type
+        self.codes = {value: code for code, value in enumerate(self.values)} if self.values is not None else None
+
+    def encode(self, value):
+        if self.codes is None:
+            if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)) or float(value) != value:
+                raise InvalidArgumentError(f"Cannot store {value!r} exactly as a number")
+            return float(value)
+        if self.column_type is str and not isinstance(value, str):
+            raise InvalidArgumentError(f"Invalid str value: {value!r}")
+        if value not in self.codes:
+            if self.column_type is not str:
+                raise InvalidArgumentError(f"Invalid {self.column_type.__name__} value: {value}")
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        return self.codes[value]
+
+    # encode for a whole column at once, returns the codes and for numbers which values are ints (None otherwise)
+    def encode_column(self, values: list) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.codes is None:
+            types = set(map(type, values))
+            if types <= {int, float}:  # plain Python numbers, only ints beyond 2**53 need a closer look
+                column = np.array(values, dtype=np.float64)
+                ints = np.array([type(value) is int for value in values], dtype=bool)
+                if not (np.abs(column[ints]) >= 2 ** 53).any():
+                    return column, ints
+            return np.array([self.encode(value) for value in values], dtype=np.float64), \
+                np.array([isinstance(value, (int, np.integer)) for value in values], dtype=bool)
+        if self.column_type is not str:
+            try:
+                return np.array([self.codes[value] for value in values], dtype=self.dtype), None
+            except (KeyError, TypeError):
+                pass  # encode names the bad value
+        return np.array([self.encode(value) for value in values], dtype=self.dtype), None
+
+    # Code to compare a column against, None if no stored row can hold the value
+    def lookup(self, value):
+        if self.codes is None:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return None
+            return number if number == value else None
+        try:
+            return self.codes.get(value)
+        except TypeError:
+            return None
+
+    # is_int: the value was stored from an int, see COLUMN_TYPES
+    def decode(self, code, is_int: bool = False):
+        if self.codes is None:
+            return int(code) if is_int else code.item()
+        return self.values[code]
+
+# Bitmask of the attributes of part that are ints stored in a number column
+def int_mask(codecs: Dict[str, ColumnCodec], part: Part) -> int:
+    mask = 0
+    for i, (attr, codec) in enumerate(codecs.items()):
+        if codec.codes is None and isinstance(getattr(part, attr), (int, np.integer)):
+            mask |= 1 << i
+    return mask
+
+# Struct-of-arrays table holding every SKU of one part class
+class PartTable:
+    def __init__(self, part_type: type, capacity: int = 1024):
+        self.part_type = part_type
+        self.fields = PART_FIELDS[part_type]
+        self.codecs = {attr: ColumnCodec(COLUMN_TYPES[attr]) for attr in self.fields}
+        self.size = 0
+        self.sku = np.empty(capacity, dtype=np.int64)
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.update = np.empty(capacity, dtype=np.int64)
+        self.ints = np.zeros(capacity, dtype=np.uint8)  # see COLUMN_TYPES
+        self.columns = {attr: np.empty(capacity, dtype=self.codecs[attr].dtype) for attr in self.fields}
+
+    def _grow(self):
+        capacity = len(self.sku) * 2
+        self.sku = np.resize(self.sku, capacity)
+        self.quantity = np.resize(self.quantity, capacity)
+        self.update = np.resize(self.update, capacity)
+        self.ints = np.resize(self.ints, capacity)
+        for attr in self.fields:
+            self.columns[attr] = np.resize(self.columns[attr], capacity)
+
+    def append(self, sku: int, part: Part, quantity: int = 0) -> int:
+        values = [self.codecs[attr].encode(getattr(part, attr)) for attr in self.fields]
+        if self.size == len(self.sku):
+            self._grow()
+        row = self.size
+        self.sku[row] = sku
+        self.quantity[row] = quantity
+        self.update[row] = to_epoch(part.update)
+        self.ints[row] = int_mask(self.codecs, part)
+        for attr, value in zip(self.fields, values):
+            self.columns[attr][row] = value
+        self.size += 1
+        return row
+
+    # Removes a row by moving the last row into its place, returns the SKU that moved (or None)
+    def remove(self, row: int):
+        last = self.size - 1
+        moved = None
+        if row != last:
+            self.sku[row] = self.sku[last]
+            self.quantity[row] = self.quantity[last]
+            self.update[row] = self.update[last]
+            self.ints[row] = self.ints[last]
+            for attr in self.fields:
+                self.columns[attr][row] = self.columns[attr][last]
+            moved = int(self.sku[row])
+        self.size = last
+        return moved
+
+    def materialize(self, row: int) -> Part:
+        ints = int(self.ints[row])
+        values = [self.codecs[attr].decode(self.columns[attr][row], ints >> i & 1) for i, attr in enumerate(self.fields)]
+        return self.part_type(from_epoch(self.update[row]), *values)
+
+    # Rows matching every attribute == value condition, computed as vectorized column comparisons
+    def select(self, kwargs: Dict[str, object]) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for attr, value in kwargs.items():
+            if attr not in self.codecs:
+                raise InvalidArgumentError(f"Invalid attribute for {self.part_type.__name__}: {attr}")
+            code = self.codecs[attr].lookup(value)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.columns[attr][:self.size] == code
+        return np.flatnonzero(mask)
+
+# Inventory with the same interface as MIL_Summer_App.Inventory that keeps every part class
+# as a columnar table, Part objects are only built when get_part, get_inventory or search asks for them.
+# Failures go through the same error modes (error_mode, last_error, typed errors) as Inventory.
+class ColumnarInventory:
+    def __init__(self):
+        self.tables: Dict[type, PartTable] = {}
+        self.locations: Dict[int, Tuple[PartTable, int]] = {}  # SKU -> (table, row)
+        self.stockout_events: Dict[int, int] = {}  # SKU -> times it ran out of stock
+        self.class_stockout_events: Dict[type, int] = defaultdict(int)  # part class -> times its SKUs ran out of stock
+        self.error_mode = "print"
+        self.last_error: Optional[Exception] = None
+        self.metrics = None  # set by inventory_metrics.instrument
+
+    max_limit = 1000000
+
+    _fail = Inventory._fail
+
+    def add_part(self, sku: int, part: Part) -> bool:
+        try:
+            if len(self.locations) >= self.max_limit:
+                raise CapacityError("Maximum number of parts reached (1 million). Cannot add more parts.")
+            if sku in self.locations:
+                raise DuplicateSkuError(f"SKU {sku} already exists.")
+            part_type = type(part)
+            if part_type not in PART_FIELDS:
+                raise InvalidArgumentError(f"Unsupported part class: {part_type.__name__}")
+            table = self.tables.get(part_type)
+            if table is None:
+                table = self.tables[part_type] = PartTable(part_type)
+            self.locations[sku] = (table, table.append(sku, part))
+            return True
+        except ValueError as e:
+            self._fail("add_part", f"Error adding part with SKU {sku}", e)
+            return False
+
+    def add_inventory(self, sku: int, quantity: int) -> bool:
+        try:
+            if sku < 0:
+                raise InvalidArgumentError("Value cannot be less than 0")
+            if sku not in self.locations:
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
+
+            table, row = self.locations[sku]
+            current_quantity = int(table.quantity[row])
+            new_quantity = current_quantity + quantity
+
+            if new_quantity < 0:
+                raise InsufficientStockError("Quantity cannot go below 0")
+
+            table.quantity[row] = new_quantity
+            table.update[row] = to_epoch(datetime.now())
+
+            if new_quantity == 0 and current_quantity > 0:
+                self.stockout_events[sku] = self.stockout_events.get(sku, 0) + 1
+                self.class_stockout_events[table.part_type] += 1
+            if new_quantity == 0 and self.error_mode == "print":
+                print(f"SKU {sku} is now out of stock.")
+            return True
+        except ValueError as e:
+            self._fail("add_inventory", f"Error adding inventory for part with SKU {sku}", e)
+            return False
+
+    def get_quantity(self, sku: int) -> int:
+        try:
+            if sku not in self.locations:
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
+            table, row = self.locations[sku]
+            return int(table.quantity[row])
+        except ValueError as e:
+            self._fail("get_quantity", f"Error getting quantity for part with SKU {sku}", e)
+            return 0
+
+    def get_inventory(self) -> List[Tuple[int, Dict[str, Part]]]:
+        try:
+            return [(sku, {"part": table.materialize(row), "quantity": int(table.quantity[row])})
+                    for sku, (table, row) in self.locations.items()]
+        except Exception as e:
+            self._fail("get_inventory", "Error getting inventory", e)
+            return []
+
+    def get_part(self, sku: int) -> Part:
+        try:
+            if sku not in self.locations:
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
+            table, row = self.locations[sku]
+            return table.materialize(row)
+        except ValueError as e:
+            self._fail("get_part", f"Error getting part with SKU {sku}", e)
+            return None
+
+    def search(self, part_class: str, **kwargs) -> List[Part]:
+        try:
+            if part_class not in PART_CLASSES:
+                raise InvalidArgumentError(f"Invalid part class: {part_class}")
+
+            part_type = PART_CLASSES[part_class]
+
+            results = []
+            for table_type, table in self.tables.items():
+                if issubclass(table_type, part_type):
+                    results.extend(table.materialize(row) for row in table.select(kwargs))
+            return results
+        except Exception as e:
+            self._fail("search", "Error searching for part", e)
+            return []
+
+    def delete_part(self, sku: int) -> bool:
+        try:
+            if sku not in self.locations:
+                raise SkuNotFoundError(f"SKU {sku} does not exist.")
+            table, row = self.locations.pop(sku)
+            moved = table.remove(row)
+            if moved is not None:
+                self.locations[moved] = (table, row)
+            self.stockout_events.pop(sku, None)
+            return True
+        except ValueError as e:
+            self._fail("delete_part", f"Error deleting part with SKU {sku}", e)
+            return False
+
+    # Total quantity in stock per part class, one vectorized sum per table
+    def usage_totals(self) -> Dict[type, int]:
+        return {part_type: int(table.quantity[:table.size].sum()) for part_type, table in self.tables.items() if table.size}
+
+    # Number of SKUs currently at zero quantity per part class
+    def out_of_stock_counts(self) -> Dict[type, int]:
+        return {part_type: int(np.count_nonzero(table.quantity[:table.size] == 0)) for part_type, table in self.tables.items() if table.size}
+
+    # Number of times SKUs of each part class went from in stock to out of stock
+    def stockout_event_counts(self) -> Dict[type, int]:
+        return {part_type: count for part_type, count in self.class_stockout_events.items() if count}
+
+    def get_stockout_events(self, sku: int) -> int:
+        return self.stockout_events.get(sku, 0)
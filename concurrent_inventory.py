@@ -0,0 +1,176 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from MIL_Summer_App import Inventory, Part, PART_CLASSES, _as_list, _in_bounds
+
+OPTIMISTIC_RETRIES = 3
+
+# Inventory that can be shared between threads.
+#
+# Stock updates only lock the stripe their SKU hashes to, so updates to different SKUs run side by
+# side. Adding and deleting parts also takes the structure lock because they change the indexes.
+# Entries are never changed in place, a quantity change stores a new entry dict, so get_inventory
+# can hand out a copy of the SKU -> entry mapping as a consistent snapshot without taking any lock.
+# Searches and list_inventory pages read the indexes optimistically and only retry (and finally lock) when a part was
+# added or deleted while they ran, so they never hold up stock updates.
+class ConcurrentInventory(Inventory):
+    replace_entries = True
+
+    def __init__(self, stripes: int = 64):
+        super().__init__()
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        self.structure_lock = threading.RLock()
+        self.version = 0  # odd while add_part or delete_part is changing the indexes
+        self.stats_lock = threading.RLock()  # stock statistics and the ledger are shared by all stripes, held only while updating them
+        self.cache_lock = threading.Lock()  # search cache bookkeeping
+
+    def _stripe(self, sku: int) -> threading.Lock:
+        return self.stripes[hash(sku) % len(self.stripes)]
+
+    def _store_quantity(self, sku: int, quantity: int):
+        entry = self.inventory[sku]
+        self._record_movement(sku, entry, quantity)
+        self.inventory[sku] = {"part": entry["part"], "quantity": quantity}
+
+    def _record_movement(self, sku: int, entry: Dict[str, Part], quantity: int):
+        with self.stats_lock:
+            super()._record_movement(sku, entry, quantity)
+
+    def _count_added(self, sku: int, part: Part):
+        with self.stats_lock:
+            super()._count_added(sku, part)
+
+    def _count_removed(self, sku: int, part: Part, quantity: int):
+        with self.stats_lock:
+            super()._count_removed(sku, part, quantity)
+
+    def _count_quantity(self, sku: int, part: Part, old: int, new: int):
+        with self.stats_lock:
+            super()._count_quantity(sku, part, old, new)
+
+    def _count_stockouts(self, sku: int, part: Part, count: int):
+        with self.stats_lock:
+            super()._count_stockouts(sku, part, count)
+
+    def _store_quantities(self, quantities: Dict[int, int], stockouts: Dict[int, int], when: Optional[datetime]) -> List[int]:
+        with self.stats_lock:
+            return super()._store_quantities(quantities, stockouts, when)
+
+    def usage_totals(self) -> Dict[type, int]:
+        with self.stats_lock:
+            return super().usage_totals()
+
+    def out_of_stock_counts(self) -> Dict[type, int]:
+        with self.stats_lock:
+            return super().out_of_stock_counts()
+
+    def stockout_event_counts(self) -> Dict[type, int]:
+        with self.stats_lock:
+            return super().stockout_event_counts()
+
+    def add_part(self, sku: int, part: Part) -> bool:
+        with self.structure_lock, self._stripe(sku):
+            self.version += 1
+            try:
+                return super().add_part(sku, part)
+            finally:
+                self.version += 1
+
+    def delete_part(self, sku: int) -> bool:
+        with self.structure_lock, self._stripe(sku):
+            self.version += 1
+            try:
+                return super().delete_part(sku)
+            finally:
+                self.version += 1
+
+    def add_inventory(self, sku: int, quantity: int) -> bool:
+        with self._stripe(sku):
+            return super().add_inventory(sku, quantity)
+
+    # Applies delta only if the quantity is still `expected`, returns whether it was applied
+    def compare_and_adjust(self, sku: int, expected: int, delta: int) -> bool:
+        with self._stripe(sku):
+            entry = self.inventory.get(sku)
+            if entry is None or entry["quantity"] != expected:
+                return False
+            return super().add_inventory(sku, delta)
+
+    # Every stripe the SKUs hash to, in stripe order so two batches cannot deadlock
+    def _stripes(self, skus: List[int]) -> List[threading.Lock]:
+        return [lock for _, lock in sorted({id(lock): lock for lock in map(self._stripe, skus)}.items())]
+
+    # Also takes the stripes of the batch, so no stock update sees a part before it has been counted
+    def add_parts_bulk(self, skus: Iterable[int], parts: Iterable[Part], quantities: Optional[Iterable[int]] = None) -> Dict[str, object]:
+        skus = _as_list(skus)
+        locks = self._stripes(skus)
+        with self.structure_lock:
+            for lock in locks:
+                lock.acquire()
+            self.version += 1
+            try:
+                return super().add_parts_bulk(skus, parts, quantities)
+            finally:
+                self.version += 1
+                for lock in reversed(locks):
+                    lock.release()
+
+    def apply_adjustments(self, skus: Iterable[int], deltas: Iterable[int]) -> Dict[str, object]:
+        skus = _as_list(skus)
+        locks = self._stripes(skus)
+        for lock in locks:
+            lock.acquire()
+        try:
+            return super().apply_adjustments(skus, deltas)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def get_inventory(self) -> List[Tuple[int, Dict[str, Part]]]:
+        # dict.copy runs as a single step under the GIL, so the snapshot never sees half of a write
+        return list(self.inventory.copy().items())
+
+    # Iterates over a snapshot taken up front, so writers can keep going while the caller walks it
+    def _iter_entries(self, part_class: Optional[str], min_quantity: Optional[int],
+                      max_quantity: Optional[int]) -> Iterator[Tuple[int, Dict[str, Part]]]:
+        for sku, data in self.inventory.copy().items():
+            if part_class is not None and not isinstance(data["part"], PART_CLASSES[part_class]):
+                continue
+            if _in_bounds(data["quantity"], min_quantity, max_quantity):
+                yield sku, data
+
+    # Runs select without locks and keeps the result if no part was added or deleted meanwhile
+    def _read(self, select):
+        for _ in range(OPTIMISTIC_RETRIES):
+            version = self.version
+            if version % 2 == 0:
+                try:
+                    result = select()
+                    if self.version == version:
+                        return result
+                except (RuntimeError, KeyError, IndexError):  # an index changed under us
+                    pass
+        with self.structure_lock:
+            return select()
+
+    def _page_by_sku(self, cursor: Optional[int], limit: int) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        return self._read(lambda: super(ConcurrentInventory, self)._page_by_sku(cursor, limit))
+
+    def _page_by_insertion(self, cursor: Optional[int], limit: int) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        return self._read(lambda: super(ConcurrentInventory, self)._page_by_insertion(cursor, limit))
+
+    def _collect(self, part_type: type, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> List[Part]:
+        return self._read(lambda: super(ConcurrentInventory, self)._collect(part_type, bounds, kwargs))
+
+    def _cache_get(self, key: Optional[tuple], part_type: type) -> Optional[tuple]:
+        with self.cache_lock:
+            return super()._cache_get(key, part_type)
+
+    def _cache_put(self, key: Optional[tuple], version: int, results: List[Part]):
+        with self.cache_lock:
+            super()._cache_put(key, version, results)
+
+    def search_nearest(self, part_class: str, attr: str, value: float, direction: str = "nearest", **kwargs) -> Optional[Part]:
+        with self.structure_lock:
+            return super().search_nearest(part_class, attr, value, direction, **kwargs)
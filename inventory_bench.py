@@ -0,0 +1,284 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from MIL_Summer_App import (Inventory, Part, Resistor, Solder, Wire, DisplayCable, EthernetCable, SolderType,
+                            DisplayCableType, EthernetCableAlphaType, EthernetCableBetaType, EthernetCableSpeed,
+                            PART_CLASSES, PART_FIELDS)
+
+# Benchmark for the Inventory hot paths. A seeded generator builds a mixed catalog over all five part
+# classes, then every workload runs a random mix of operations against it. Results are written as JSON
+# and can be compared against a saved run to catch regressions:
+#   python inventory_bench.py --size 100000 --output baseline.json
+#   python inventory_bench.py --size 100000 --baseline baseline.json
+
+# Share of each part class in the catalog
+CLASS_WEIGHTS = {Resistor: 40, Wire: 20, Solder: 10, DisplayCable: 15, EthernetCable: 15}
+
+E12 = (10, 12, 15, 18, 22, 27, 33, 39, 47, 56, 68, 82)
+LENGTHS = (0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+COLORS = ("black", "white", "gray", "red", "blue", "yellow")
+
+# Operation weights of every workload. get_inventory and delete_part are measured in their own phases
+# because their cost grows with the catalog rather than with the number of operations.
+WORKLOADS = {
+    "read-heavy": {"get_quantity": 80, "add_inventory": 10, "search": 10},
+    "write-heavy": {"add_inventory": 70, "get_quantity": 15, "add_part": 5, "delete_part": 5, "search": 5},
+    "search-heavy": {"search": 60, "search_range": 20, "get_quantity": 15, "add_inventory": 5},
+}
+
+PAGE_SIZE = 100  # rows per list_inventory page in the scan phase
+
+def _engines() -> Dict[str, Callable[[], object]]:
+    def concurrent():
+        from concurrent_inventory import ConcurrentInventory
+        return ConcurrentInventory()
+
+    def columnar():
+        from columnar_inventory import ColumnarInventory
+        return ColumnarInventory()
+
+    def sharded():
+        from sharded_inventory import ShardedInventory
+        return ShardedInventory()
+
+    return {"inventory": Inventory, "concurrent": concurrent, "columnar": columnar, "sharded": sharded}
+
+# Engines that keep the parts in other processes, tracemalloc only sees this one so their memory is not measured
+OTHER_PROCESSES = {"sharded"}
+
+def _close(inventory):
+    if hasattr(inventory, "close"):
+        inventory.close()
+
+def make_part(rng: random.Random, update: datetime) -> Part:
+    part_type = rng.choices(list(CLASS_WEIGHTS), weights=list(CLASS_WEIGHTS.values()))[0]
+    if part_type is Resistor:
+        return Resistor(update, rng.choice(E12) * 10 ** rng.randrange(6), rng.choice((1, 2, 5, 5, 5, 10)))
+    if part_type is Solder:
+        return Solder(update, rng.choice(list(SolderType)), rng.choice(LENGTHS))
+    if part_type is Wire:
+        return Wire(update, rng.randrange(10, 32, 2), rng.choice(LENGTHS))
+    if part_type is DisplayCable:
+        return DisplayCable(update, rng.choice(list(DisplayCableType)), rng.choice(LENGTHS[:6]), rng.choice(COLORS))
+    return EthernetCable(update, rng.choice(list(EthernetCableAlphaType)), rng.choice(list(EthernetCableBetaType)),
+                         rng.choice(list(EthernetCableSpeed)), rng.choice(LENGTHS))
+
+# Same seed, same catalog: SKUs 0..size-1 with their parts and starting quantities
+def make_catalog(size: int, seed: int) -> List[Tuple[int, Part, int]]:
+    rng = random.Random(seed)
+    start = datetime(2024, 6, 1)
+    return [(sku, make_part(rng, start + timedelta(minutes=rng.randrange(60 * 24 * 90))), rng.choice((0, rng.randrange(1, 1000))))
+            for sku in range(size)]
+
+def _search_args(rng: random.Random, part: Part) -> Tuple[str, Dict[str, object]]:
+    part_class = next(key for key, part_type in PART_CLASSES.items() if type(part) is part_type)
+    fields = PART_FIELDS[type(part)]
+    # Mostly lookups of one specific part, sometimes a broad query on a single attribute
+    chosen = fields if rng.random() < 0.7 else (rng.choice(fields),)
+    return part_class, {attr: getattr(part, attr) for attr in chosen}
+
+# Latencies in microseconds, summarised as count, throughput and percentiles
+def summarize(latencies: List[float], errors: int) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    total = sum(latencies)
+
+    def percentile(p):
+        return round(latencies[min(count - 1, int(count * p))], 2)
+
+    return {
+        "count": count,
+        "errors": errors,
+        "throughput": round(count / (total / 1e6)) if total else 0,
+        "mean_us": round(total / count, 2),
+        "p50_us": percentile(0.5),
+        "p90_us": percentile(0.9),
+        "p99_us": percentile(0.99),
+        "max_us": round(latencies[-1], 2),
+    }
+
+class Recorder:
+    def __init__(self):
+        gc.collect()  # start every phase without garbage left over from the previous one
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    def time(self, op: str, call: Callable, *args):
+        started = time.perf_counter_ns()
+        result = call(*args)
+        self.latencies.setdefault(op, []).append((time.perf_counter_ns() - started) / 1000)
+        if result is False:
+            self.errors[op] = self.errors.get(op, 0) + 1
+        return result
+
+    def result(self) -> Dict[str, object]:
+        elapsed = time.perf_counter() - self.started
+        count = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "operations": count,
+            "seconds": round(elapsed, 3),
+            "throughput": round(count / elapsed) if elapsed else 0,
+            "ops": {op: summarize(latencies, self.errors.get(op, 0)) for op, latencies in self.latencies.items()},
+        }
+
+def _load(inventory, catalog: List[Tuple[int, Part, int]], recorder: Recorder = None):
+    for sku, part, quantity in catalog:
+        if recorder is None:
+            inventory.add_part(sku, part)
+            if quantity:
+                inventory.add_inventory(sku, quantity)
+        else:
+            recorder.time("add_part", inventory.add_part, sku, part)
+            if quantity:
+                recorder.time("add_inventory", inventory.add_inventory, sku, quantity)
+
+def run_workload(inventory, catalog: List[Tuple[int, Part, int]], weights: Dict[str, int], operations: int,
+                 rng: random.Random) -> Dict[str, object]:
+    weights = {op: weight for op, weight in weights.items() if hasattr(inventory, op)}  # e.g. no search_range in the columnar engine
+    ops = rng.choices(list(weights), weights=list(weights.values()), k=operations)
+    size = len(catalog)
+    next_sku = size
+    added: List[int] = []  # SKUs created by this workload, the only ones it deletes
+    recorder = Recorder()
+    for op in ops:
+        # Popular SKUs are picked far more often than the long tail
+        sku, part, _ = catalog[int(size * rng.random() ** 3)]
+        if op == "get_quantity":
+            recorder.time(op, inventory.get_quantity, sku)
+        elif op == "add_inventory":
+            recorder.time(op, inventory.add_inventory, sku, rng.choice((-5, -2, -1, 1, 2, 5, 20)))
+        elif op == "search":
+            part_class, attributes = _search_args(rng, part)
+            recorder.time(op, lambda: inventory.search(part_class, **attributes))
+        elif op == "search_range":
+            part_class, attributes = _search_args(rng, part)
+            attr = "resistance" if isinstance(part, Resistor) else "gauge" if isinstance(part, Wire) else "length"
+            value = getattr(part, attr)
+            attributes.pop(attr, None)
+            recorder.time(op, lambda: inventory.search_range(part_class, {attr: (value / 2, value * 2)}, **attributes))
+        elif op == "add_part":
+            recorder.time(op, inventory.add_part, next_sku, make_part(rng, part.update))
+            added.append(next_sku)
+            next_sku += 1
+        elif op == "delete_part" and added:
+            recorder.time(op, inventory.delete_part, added.pop(rng.randrange(len(added))))
+    for sku in added:
+        inventory.delete_part(sku)
+    return recorder.result()
+
+# Memory of a fresh inventory holding the catalog, parts included: the catalog is generated inside the traced
+# region, and the list of it is dropped before the current size is read. The peak counts the list too.
+def measure_memory(factory: Callable[[], object], size: int, seed: int) -> Dict[str, int]:
+    tracemalloc.start()
+    catalog = make_catalog(size, seed)
+    inventory = factory()
+    _load(inventory, catalog)
+    del catalog
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _close(inventory)
+    return {"inventory_bytes": current, "peak_bytes": peak, "bytes_per_sku": current // max(1, size)}
+
+def run(engine: str, size: int, operations: int, seed: int, workloads: List[str], scans: int, memory: bool) -> Dict[str, object]:
+    factory = _engines()[engine]
+    catalog = make_catalog(size, seed)
+    result = {
+        "config": {"engine": engine, "size": size, "operations": operations, "seed": seed, "scans": scans},
+        "python": sys.version.split()[0],
+        "phases": {},
+    }
+
+    # Inventory methods print their errors and stock-outs, keep that out of the timings
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        inventory = factory()
+        recorder = Recorder()
+        _load(inventory, catalog, recorder)
+        result["phases"]["load"] = recorder.result()
+
+        for number, name in enumerate(workloads):
+            rng = random.Random(seed * 1000 + number + 1)
+            result["phases"][name] = run_workload(inventory, catalog, WORKLOADS[name], operations, rng)
+
+        recorder = Recorder()
+        for _ in range(scans):
+            recorder.time("get_inventory", inventory.get_inventory)
+        if hasattr(inventory, "list_inventory"):  # one walk over every page, each page should cost the same
+            cursor = None
+            while True:
+                _, cursor = recorder.time("list_inventory", inventory.list_inventory, cursor, PAGE_SIZE)
+                if cursor is None:
+                    break
+        result["phases"]["scan"] = recorder.result()
+
+        recorder = Recorder()
+        for sku, _, _ in catalog:
+            recorder.time("delete_part", inventory.delete_part, sku)
+        result["phases"]["teardown"] = recorder.result()
+        _close(inventory)
+
+        if memory and engine not in OTHER_PROCESSES:
+            result["memory"] = measure_memory(factory, size, seed)
+    return result
+
+# Lists everything that got worse than the baseline by more than `threshold` (0.2 = 20%): lower
+# throughput, higher p99 latency or more memory
+def compare(result: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[str]:
+    regressions = []
+    if result["config"] != baseline.get("config"):
+        regressions.append(f"Config differs from the baseline: {baseline.get('config')}")
+    for phase, data in result["phases"].items():
+        old_phase = baseline.get("phases", {}).get(phase)
+        if old_phase is None:
+            continue
+        for op, stats in data["ops"].items():
+            old = old_phase["ops"].get(op)
+            if old is None:
+                continue
+            if stats["throughput"] < old["throughput"] * (1 - threshold):
+                regressions.append(f"{phase}/{op}: throughput {stats['throughput']} ops/s, baseline {old['throughput']} ops/s")
+            if stats["p99_us"] > old["p99_us"] * (1 + threshold):
+                regressions.append(f"{phase}/{op}: p99 {stats['p99_us']} us, baseline {old['p99_us']} us")
+    if "memory" in result and "memory" in baseline:
+        if result["memory"]["peak_bytes"] > baseline["memory"]["peak_bytes"] * (1 + threshold):
+            regressions.append(f"memory: peak {result['memory']['peak_bytes']} bytes, baseline {baseline['memory']['peak_bytes']} bytes")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the inventory on a synthetic catalog")
+    parser.add_argument("--engine", choices=sorted(_engines()), default="inventory")
+    parser.add_argument("--size", type=int, default=100000, help="number of SKUs in the catalog (up to Inventory.max_limit)")
+    parser.add_argument("--operations", type=int, default=20000, help="operations per workload")
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS), help="workloads to run, all by default")
+    parser.add_argument("--scans", type=int, default=5, help="get_inventory calls to time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement (always skipped for sharded)")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    parser.add_argument("--baseline", help="compare against a result saved with --output, exits with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = run(args.engine, args.size, args.operations, args.seed, args.workload or list(WORKLOADS), args.scans, not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.", file=sys.stderr)
@@ -0,0 +1,121 @@
+import csv
+import json
+from itertools import islice
+from typing import Dict, Iterator, Optional, Tuple
+
+from MIL_Summer_App import Inventory, Part, PART_CLASSES, PART_FIELDS, ENUM_FIELDS, part_to_dict, part_from_dict, _in_bounds
+
+CHUNK_SIZE = 10000
+
+# CSV columns: the entry itself, then every part attribute once, left empty where a class does not have it
+CSV_FIELDS = ["sku", "quantity", "type", "update"]
+for _fields in PART_FIELDS.values():
+    CSV_FIELDS.extend(attr for attr in _fields if attr not in CSV_FIELDS)
+
+def _rows(inventory: Inventory, part_class: Optional[str], min_quantity: Optional[int],
+          max_quantity: Optional[int]) -> Iterator[Dict[str, object]]:
+    for sku, data in inventory.iter_inventory(part_class, min_quantity, max_quantity):
+        row = {"sku": sku, "quantity": data["quantity"]}
+        row.update(part_to_dict(data["part"]))
+        yield row
+
+def _chunks(rows: Iterator, chunk_size: int) -> Iterator[list]:
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+# Writes the inventory to a CSV file, Enum fields by value, returns the number of rows written
+def export_csv(inventory: Inventory, path: str, part_class: Optional[str] = None, min_quantity: Optional[int] = None,
+               max_quantity: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> int:
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for chunk in _chunks(_rows(inventory, part_class, min_quantity, max_quantity), chunk_size):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+# Writes the inventory as JSON Lines, one {"sku", "quantity", "type", "update", attributes...} object per line
+def export_jsonl(inventory: Inventory, path: str, part_class: Optional[str] = None, min_quantity: Optional[int] = None,
+                 max_quantity: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> int:
+    count = 0
+    with open(path, "w") as f:
+        for chunk in _chunks(_rows(inventory, part_class, min_quantity, max_quantity), chunk_size):
+            f.write("".join(json.dumps(row) + "\n" for row in chunk))
+            count += len(chunk)
+    return count
+
+def _number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+# CSV gives back strings, turn the numeric columns back into numbers
+def _from_csv(row: Dict[str, str]) -> Dict[str, object]:
+    data = {"sku": int(row["sku"]), "quantity": int(row["quantity"]), "type": row["type"], "update": row["update"]}
+    for attr in CSV_FIELDS[4:]:
+        value = row.get(attr, "")
+        if value != "":
+            data[attr] = value if attr in ENUM_FIELDS or attr == "color" else _number(value)
+    return data
+
+def _parse(rows: Iterator[Tuple[int, Dict[str, object]]], part_class: Optional[str], min_quantity: Optional[int],
+           max_quantity: Optional[int], errors: Dict[int, Tuple[Optional[int], str]]) -> Iterator[Tuple[int, int, int, Part]]:
+    if part_class is not None and part_class not in PART_CLASSES:
+        errors[0] = (None, f"Invalid part class: {part_class}")  # line 0 stands for the whole file
+        return
+    part_type = PART_CLASSES[part_class] if part_class is not None else Part
+    for number, data in rows:
+        try:
+            part = part_from_dict(data)
+            if data["quantity"] < 0:
+                raise ValueError("Quantity cannot go below 0")
+            if isinstance(part, part_type) and _in_bounds(data["quantity"], min_quantity, max_quantity):
+                yield number, data["sku"], data["quantity"], part
+        except (KeyError, ValueError, TypeError) as e:
+            errors[number] = (data.get("sku") if isinstance(data, dict) else None, f"Invalid row: {e}")
+
+# Adds the parsed rows chunk by chunk. Each chunk is applied all-or-nothing through add_parts_bulk with the
+# quantities, so a bad row only holds back its own chunk and the parts keep their exported update time.
+def _load(inventory: Inventory, parts: Iterator[Tuple[int, int, int, Part]], chunk_size: int,
+          errors: Dict[int, Tuple[Optional[int], str]]) -> Dict[str, object]:
+    imported = 0
+    for chunk in _chunks(parts, chunk_size):
+        report = inventory.add_parts_bulk([sku for _, sku, _, _ in chunk], [part for _, _, _, part in chunk],
+                                          [quantity for _, _, quantity, _ in chunk])
+        if not report["applied"]:
+            errors.update((chunk[row][0], error) for row, error in report["errors"].items())
+            continue
+        imported += len(chunk)
+    return {"imported": imported, "errors": errors}
+
+# Reads rows written by export_csv into the inventory, returns {"imported": rows, "errors": {line: (sku, message)}}
+def import_csv(inventory: Inventory, path: str, part_class: Optional[str] = None, min_quantity: Optional[int] = None,
+               max_quantity: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, object]:
+    errors = {}
+    with open(path, newline="") as f:
+        def rows():
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    yield number, _from_csv(row)
+                except (KeyError, ValueError) as e:
+                    errors[number] = (None, f"Invalid row: {e}")
+        return _load(inventory, _parse(rows(), part_class, min_quantity, max_quantity, errors), chunk_size, errors)
+
+# Reads rows written by export_jsonl into the inventory, returns {"imported": rows, "errors": {line: (sku, message)}}
+def import_jsonl(inventory: Inventory, path: str, part_class: Optional[str] = None, min_quantity: Optional[int] = None,
+                 max_quantity: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, object]:
+    errors = {}
+    with open(path) as f:
+        def rows():
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as e:
+                        errors[number] = (None, f"Invalid row: {e}")
+        return _load(inventory, _parse(rows(), part_class, min_quantity, max_quantity, errors), chunk_size, errors)
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from MIL_Summer_App import Inventory
+
+# Public Inventory operations that get counted and timed
+OPERATIONS = ("add_part", "add_inventory", "add_parts_bulk", "apply_adjustments", "get_quantity", "get_part",
+              "get_inventory", "list_inventory", "search", "search_range", "search_tolerance", "search_nearest", "delete_part",
+              "reorder_report")
+
+# Latencies go into log-linear buckets: exact below 8 ns, then four buckets per power of two, so a
+# percentile read from the histogram is at most 25% above the true value
+BUCKETS = 4 * 64
+
+def _bucket_bounds(bucket: int):
+    if bucket < 8:
+        return bucket, bucket + 1
+    shift = bucket // 4 - 1
+    return (4 + bucket % 4) << shift, (5 + bucket % 4) << shift
+
+# Call counts, error counts by cause and latency histograms per operation. Recording is a handful of
+# integer updates on one list per operation, summaries are only worked out when stats() is called.
+# With locked=True the updates are made under a lock, for inventories shared between threads.
+class InventoryMetrics:
+    def __init__(self, exporter: Optional[Callable[[Dict[str, object]], None]] = None, export_interval: Optional[float] = None,
+                 locked: bool = False):
+        self.exporter = exporter
+        self.export_interval = export_interval  # seconds between automatic exports, None to only export on request
+        self.lock = threading.Lock()
+        if locked:
+            self.record = self._record_locked
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters: Dict[str, List[int]] = {}  # operation -> [calls, total ns, max ns, histogram buckets...]
+            self.errors: Dict[str, Dict[str, int]] = {}  # operation -> error class name -> count
+            self.started = time.time()
+            self.last_export = time.perf_counter_ns()
+
+    def record(self, op: str, started: int, finished: int):
+        elapsed = finished - started
+        bits = elapsed.bit_length()
+        counters = self.counters.get(op)
+        if counters is None:
+            counters = self.counters[op] = [0] * (3 + BUCKETS)
+        counters[0] += 1
+        counters[1] += elapsed
+        if elapsed > counters[2]:
+            counters[2] = elapsed
+        counters[3 + (elapsed if bits <= 3 else (bits - 2) * 4 + ((elapsed >> (bits - 3)) & 3))] += 1
+        if self.export_interval is not None and finished - self.last_export >= self.export_interval * 1e9:
+            self.last_export = finished
+            self.export()
+
+    def _record_locked(self, op: str, started: int, finished: int):
+        with self.lock:
+            InventoryMetrics.record(self, op, started, finished)
+
+    def record_error(self, op: str, error: Exception):
+        cause = type(error).__name__
+        with self.lock:
+            causes = self.errors.setdefault(op, {})
+            causes[cause] = causes.get(cause, 0) + 1
+
+    # Snapshot of everything recorded so far:
+    # {"since": unix time, "operations": {op: {"calls", "errors", "error_causes", "mean_us", "p50_us", "p90_us",
+    #  "p99_us", "max_us", "histogram": [[upper bound in us, count], ...]}}}
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            counters = {op: list(values) for op, values in self.counters.items()}
+            errors = {op: dict(causes) for op, causes in self.errors.items()}
+
+        operations = {}
+        for op in list(counters) + [op for op in errors if op not in counters]:
+            count, total_ns, max_ns = counters[op][:3] if op in counters else (0, 0, 0)
+            histogram = counters[op][3:] if op in counters else []
+            causes = errors.get(op, {})
+            summary = {"calls": count, "errors": sum(causes.values()), "error_causes": causes}
+            if count:
+                summary["mean_us"] = round(total_ns / count / 1000, 3)
+                for name, p in (("p50_us", 0.5), ("p90_us", 0.9), ("p99_us", 0.99)):
+                    summary[name] = round(min(self._percentile(histogram, count, p), max_ns) / 1000, 3)
+                summary["max_us"] = round(max_ns / 1000, 3)
+                summary["histogram"] = [[_bucket_bounds(bucket)[1] / 1000, n] for bucket, n in enumerate(histogram) if n]
+            operations[op] = summary
+        return {"since": self.started, "operations": operations}
+
+    @staticmethod
+    def _percentile(histogram: List[int], count: int, p: float) -> int:
+        rank = max(1, int(count * p + 0.5))
+        seen = 0
+        for bucket, n in enumerate(histogram):
+            seen += n
+            if seen >= rank:
+                return _bucket_bounds(bucket)[1]
+        return 0
+
+    def export(self):
+        if self.exporter is not None:
+            self.exporter(self.stats())
+
+# Exporters take the stats() snapshot, anything with that call signature can be plugged in
+def print_exporter(stats: Dict[str, object]):
+    for op, summary in stats["operations"].items():
+        latency = f", p50 {summary['p50_us']} us, p99 {summary['p99_us']} us" if summary["calls"] else ""
+        print(f"{op}: {summary['calls']} calls, {summary['errors']} errors{latency}")
+
+# Appends every snapshot as one JSON line, with the time it was taken
+class JsonLinesExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, stats: Dict[str, object]):
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"time": time.time(), **stats}) + "\n")
+
+def _timed(metrics: InventoryMetrics, op: str, method: Callable) -> Callable:
+    clock = time.perf_counter_ns
+
+    @wraps(method)
+    def call(*args, **kwargs):
+        started = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.record(op, started, clock())
+    return call
+
+# Starts counting and timing the public operations of one inventory. The wrappers are set on the
+# instance, so inventories that are not instrumented pay nothing. Returns the metrics, which are
+# also reachable as inventory.metrics and through inventory.stats().
+def instrument(inventory: Inventory, exporter: Optional[Callable[[Dict[str, object]], None]] = None,
+               export_interval: Optional[float] = None) -> InventoryMetrics:
+    from concurrent_inventory import ConcurrentInventory
+
+    uninstrument(inventory)
+    metrics = InventoryMetrics(exporter, export_interval, locked=isinstance(inventory, ConcurrentInventory))
+    for op in OPERATIONS:
+        method = getattr(inventory, op, None)
+        if method is not None:
+            setattr(inventory, op, _timed(metrics, op, method))
+    inventory.metrics = metrics
+    return metrics
+
+def uninstrument(inventory: Inventory):
+    for op in OPERATIONS:
+        inventory.__dict__.pop(op, None)
+    inventory.metrics = None
@@ -0,0 +1,291 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+from typing import Dict, Iterable, Optional
+
+from datetime import datetime
+
+import numpy as np
+
+from MIL_Summer_App import Inventory, InventoryError, InvalidArgumentError, Part, PART_TYPES, part_to_dict, part_from_dict, to_epoch, from_epoch, _as_list
+from inventory_snapshot import MAGIC, check_part, read_snapshot, write_snapshot
+
+# Log record header: sequence number, operation, SKU, a value that is the delta for stock adjustments
+# and the length of the JSON encoded part that follows for added parts, and the time of the change
+RECORD = struct.Struct("<QBqqq")
+# The same header as a NumPy record, to read runs of stock adjustments (which have no payload) in one go
+RECORD_DTYPE = np.dtype([("sequence", "<u8"), ("op", "u1"), ("sku", "<i8"), ("value", "<i8"), ("when", "<i8")])
+
+ADD_PART = 1
+ADJUST = 2
+DELETE_PART = 3
+
+REPLAY_BATCH = 100000
+
+READ_ONLY = "Inventory was opened read-only."
+
+class ReadOnlyError(InventoryError):
+    pass
+
+# Only parts the log and the snapshots can give back exactly are stored: a class registered in PART_TYPES
+# and values the snapshot records hold (see inventory_snapshot.check_part)
+def _unsupported(part: Part) -> Optional[str]:
+    try:
+        check_part(part)
+    except InvalidArgumentError as e:
+        return str(e)
+    return None
+
+# Snapshots are binary (inventory_snapshot), ones written before that are pickled (sequence, rows with parts as
+# dicts, stock-outs per SKU, stock-outs per class name). Returns what read_snapshot returns.
+def _read_snapshot(path: str):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return read_snapshot(path)
+        f.seek(0)
+        sequence, rows, stockout_events, class_stockout_events = pickle.load(f)
+    return (sequence, [(sku, quantity, part_from_dict(data)) for sku, quantity, data in rows], stockout_events,
+            {PART_TYPES[name]: count for name, count in class_stockout_events.items()})
+
+# Inventory that appends every successful mutation to a write-ahead log in `directory` and takes
+# periodic snapshots. Opening the same directory again loads the latest snapshot and replays only
+# the log records written after it. With read_only=True the directory is only read: a torn record at the end of
+# the log is skipped instead of cut off, so reports can open the data of a running menu or service, and every
+# change is refused.
+class PersistentInventory(Inventory):
+    def __init__(self, directory: str, sync_every: int = 1000, snapshot_every: int = 1000000, read_only: bool = False):
+        super().__init__()
+        self.directory = directory
+        self.read_only = read_only
+        self.log_path = os.path.join(directory, "inventory.log")
+        self.snapshot_path = os.path.join(directory, "inventory.snapshot")
+        self.sync_every = sync_every          # records written between fsyncs of the log
+        self.snapshot_every = snapshot_every  # records written between snapshots
+        self.sequence = 0                     # sequence number of the last record written
+        self.unsynced = 0
+        self.since_snapshot = 0
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self.log = open(self.log_path, "ab") if not read_only else None
+
+    def _recover(self):
+        snapshot_sequence = 0
+        if os.path.exists(self.snapshot_path):
+            snapshot_sequence, rows, stockout_events, class_stockout_events = _read_snapshot(self.snapshot_path)
+            Inventory.add_parts_bulk(self, [row[0] for row in rows], [row[2] for row in rows], [row[1] for row in rows])
+            self.stockout_events.update(stockout_events)
+            for part_type, count in class_stockout_events.items():
+                self.class_stockout_events[part_type] += count
+        self.sequence = snapshot_sequence
+
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+            return
+
+        # Replay consecutive records of the same kind as one bulk call, records already in the snapshot are skipped.
+        # Runs of stock adjustments are read and folded with NumPy instead of record by record.
+        with open(self.log_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+            offset = 0
+            batch_op = None
+            skus = []
+            values = []
+            while offset + RECORD.size <= size:
+                sequence, op, sku, value, when = RECORD.unpack_from(buffer, offset)
+                if op == ADJUST:
+                    self._replay(batch_op, skus, values)
+                    batch_op, skus, values = None, [], []
+                    offset = self._replay_adjustments(buffer, offset, size, snapshot_sequence)
+                    continue
+                end = offset + RECORD.size + (value if op == ADD_PART else 0)
+                if end > size:
+                    break  # torn write at the end of the log
+                if sequence > snapshot_sequence:
+                    if op != batch_op or len(skus) >= REPLAY_BATCH:
+                        self._replay(batch_op, skus, values)
+                        batch_op, skus, values = op, [], []
+                    skus.append(sku)
+                    values.append(part_from_dict(json.loads(buffer[offset + RECORD.size:end])) if op == ADD_PART else value)
+                    self.sequence = sequence
+                offset = end
+            self._replay(batch_op, skus, values)
+
+        if offset < size and not self.read_only:
+            os.truncate(self.log_path, offset)
+
+    def _replay(self, op: int, skus: list, values: list):
+        if not skus:
+            return
+        if op == ADD_PART:
+            report = Inventory.add_parts_bulk(self, skus, values)
+        else:
+            for sku in skus:
+                Inventory.delete_part(self, sku)
+            return
+        if not report["applied"]:
+            print(f"Error replaying log: {report['errors']}")
+
+    # Replays the run of stock adjustments starting at offset as one batch and returns the offset where it ends.
+    # The end is found by reading chunks that grow up to REPLAY_BATCH records.
+    def _replay_adjustments(self, buffer: mmap.mmap, offset: int, size: int, snapshot_sequence: int) -> int:
+        chunk = 64
+        runs = []
+        while True:
+            count = min(chunk, (size - offset) // RECORD.size)
+            if count == 0:
+                break
+            records = np.frombuffer(buffer[offset:offset + count * RECORD.size], dtype=RECORD_DTYPE)
+            others = np.flatnonzero(records["op"] != ADJUST)
+            runs.append(records[:others[0]] if len(others) else records)
+            offset += len(runs[-1]) * RECORD.size
+            if len(runs[-1]) < count:
+                break
+            chunk = min(chunk * 2, REPLAY_BATCH)
+        run = np.concatenate(runs)
+        self._apply_run(run[run["sequence"] > snapshot_sequence])
+        return offset
+
+    # Folds a run of logged adjustments into one net change per SKU. Running quantities are worked out per SKU
+    # in log order, so the run is rejected like apply_adjustments would if a SKU is missing or a quantity goes
+    # below 0, and stock-outs within the batch are still counted. Every part gets the time of its last change.
+    def _apply_run(self, run: np.ndarray):
+        if not len(run):
+            return
+        self.sequence = int(run["sequence"][-1])
+        order = np.argsort(run["sku"], kind="stable")
+        skus = run["sku"][order]
+        deltas = run["value"][order]
+        starts = np.flatnonzero(np.r_[True, skus[1:] != skus[:-1]])
+        ends = np.append(starts[1:], len(skus))
+        unique = skus[starts].tolist()
+        entries = [self.inventory.get(sku) for sku in unique]
+        errors = {int(order[start]): (sku, f"SKU {sku} does not exist.")
+                  for start, sku, entry in zip(starts, unique, entries) if entry is None}
+        if not errors:
+            base = np.array([entry["quantity"] for entry in entries], dtype=np.int64)
+            totals = np.cumsum(deltas)
+            running = totals - np.repeat(totals[starts] - deltas[starts] - base, ends - starts)
+            errors = {int(order[row]): (int(skus[row]), "Quantity cannot go below 0") for row in np.flatnonzero(running < 0)}
+        if errors:
+            print(f"Error replaying log: {errors}")
+            return
+        emptied = np.add.reduceat(((running == 0) & (running - deltas > 0)).astype(np.int64), starts)
+        stockouts = {unique[i]: int(emptied[i]) for i in np.flatnonzero(emptied)}
+        self._store_quantities(dict(zip(unique, running[ends - 1].tolist())), stockouts, None)
+        for entry, when in zip(entries, run["when"][order][ends - 1].tolist()):
+            entry["part"].update = from_epoch(when)
+
+    def _append(self, op: int, sku: int, value: int, payload: bytes = b"", when: Optional[datetime] = None):
+        self.sequence += 1
+        self.log.write(RECORD.pack(self.sequence, op, sku, value, to_epoch(when or datetime.now())) + payload)
+        self.unsynced += 1
+        self.since_snapshot += 1
+
+    # Called once a whole operation is in the log, so a snapshot never lands in the middle of a batch
+    def _commit(self):
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        elif self.unsynced >= self.sync_every:
+            self.sync()
+
+    def _writable(self, op: str, message: str) -> bool:
+        if self.read_only:
+            self._fail(op, message, ReadOnlyError(READ_ONLY))
+            return False
+        return True
+
+    def _append_part(self, sku: int, part: Part):
+        payload = json.dumps(part_to_dict(part), separators=(",", ":")).encode()
+        self._append(ADD_PART, sku, len(payload), payload)
+
+    def add_part(self, sku: int, part: Part) -> bool:
+        if not self._writable("add_part", f"Error adding part with SKU {sku}"):
+            return False
+        unsupported = _unsupported(part)
+        if unsupported is not None:  # checked first, a part the log cannot hold never reaches memory
+            self._fail("add_part", f"Error adding part with SKU {sku}", InvalidArgumentError(unsupported))
+            return False
+        if not super().add_part(sku, part):
+            return False
+        self._append_part(sku, part)
+        self._commit()
+        return True
+
+    def add_inventory(self, sku: int, quantity: int) -> bool:
+        if not self._writable("add_inventory", f"Error adding inventory for part with SKU {sku}") or not super().add_inventory(sku, quantity):
+            return False
+        self._append(ADJUST, sku, quantity, when=self.inventory[sku]["part"].update)
+        self._commit()
+        return True
+
+    def delete_part(self, sku: int) -> bool:
+        if not self._writable("delete_part", f"Error deleting part with SKU {sku}") or not super().delete_part(sku):
+            return False
+        self._append(DELETE_PART, sku, 0)
+        self._commit()
+        return True
+
+    def add_parts_bulk(self, skus: Iterable[int], parts: Iterable[Part], quantities: Optional[Iterable[int]] = None) -> Dict[str, object]:
+        skus = _as_list(skus)
+        parts = _as_list(parts)
+        quantities = _as_list(quantities) if quantities is not None else None
+        if self.read_only:
+            return {"applied": False, "total": len(skus), "errors": {0: (None, READ_ONLY)}}
+        # Parts the log cannot hold reject the batch before anything reaches memory, a length mismatch is left to Inventory
+        errors = {}
+        for row, (sku, part) in enumerate(zip(skus, parts)):
+            message = _unsupported(part)
+            if message is not None:
+                errors[row] = (sku, message)
+        if errors and len(skus) == len(parts):
+            return {"applied": False, "total": len(skus), "errors": errors}
+        report = super().add_parts_bulk(skus, parts, quantities)
+        if report["applied"]:
+            for sku, part in zip(skus, parts):
+                self._append_part(sku, part)
+            # Starting stock is logged with the parts' own update time, which replaying puts back
+            for sku, quantity, part in zip(skus, quantities or (), parts):
+                if quantity:
+                    self._append(ADJUST, sku, quantity, when=part.update)
+            self._commit()
+        return report
+
+    def apply_adjustments(self, skus: Iterable[int], deltas: Iterable[int]) -> Dict[str, object]:
+        skus = _as_list(skus)
+        deltas = _as_list(deltas)
+        if self.read_only:
+            return {"applied": False, "total": len(skus), "errors": {0: (None, READ_ONLY)}, "out_of_stock": []}
+        report = super().apply_adjustments(skus, deltas)
+        if report["applied"]:
+            for sku, delta in zip(skus, deltas):
+                self._append(ADJUST, sku, delta, when=self.inventory[sku]["part"].update)
+            self._commit()
+        return report
+
+    # Flushes the log and fsyncs it, called every sync_every records
+    def sync(self):
+        if self.log is None:
+            return
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.unsynced = 0
+
+    # Writes the whole inventory to a new binary snapshot (inventory_snapshot) and empties the log. The snapshot
+    # records the sequence number it covers, so a crash before the log is truncated cannot apply a record twice.
+    # MappedInventory can serve the snapshot file directly.
+    def snapshot(self):
+        if not self._writable("snapshot", "Error taking snapshot"):
+            return
+        self.sync()
+        write_snapshot(self, self.snapshot_path, self.sequence)
+        self.log.truncate(0)
+        self.sync()
+        self.since_snapshot = 0
+
+    def close(self):
+        if self.log is not None:
+            self.sync()
+            self.log.close()
@@ -0,0 +1,77 @@
+import argparse
+import os
+from typing import Dict, List, Sequence, Tuple
+
+# Charts of the stock statistics. They are drawn from counts the inventory already keeps up to date
+# (usage_totals, stockout_event_counts), never by walking the inventory, and matplotlib is only
+# imported once a chart is actually drawn so importing this module stays cheap.
+
+# (file name, y axis label, title) of every chart
+USAGE_CHART = ("usage", "Usage Count", "Usage Count of Parts")
+STOCKOUT_CHART = ("out_of_stock", "Occurrence Count", "Number of Times Parts Fall Out of Stock")
+
+# Turns {part class or name: count} into (name, count) pairs, largest count first
+def sort_counts(counts: Dict[object, int]) -> List[Tuple[str, int]]:
+    named = ((key if isinstance(key, str) else key.__name__, count) for key, count in counts.items())
+    return sorted(named, key=lambda x: x[1], reverse=True)
+
+def _draw(axes, counts: List[Tuple[str, int]], ylabel: str, title: str):
+    axes.bar(range(len(counts)), [count for name, count in counts], align='center', alpha=0.5)
+    axes.set_xticks(range(len(counts)))
+    axes.set_xticklabels([name for name, count in counts], rotation=45)
+    axes.set_xlabel('Parts')
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+
+# Opens a chart window
+def show_chart(counts: Dict[object, int], ylabel: str, title: str):
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(12, 6))
+    _draw(axes, sort_counts(counts), ylabel, title)
+    figure.tight_layout()
+    plt.show()
+
+# Writes a chart to path, the format comes from the extension (.png, .svg, .pdf, ...). Uses a bare
+# Figure instead of pyplot, so it needs no display and works from batch jobs and servers.
+def save_chart(counts: Dict[object, int], ylabel: str, title: str, path: str):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 6))
+    _draw(figure.subplots(), sort_counts(counts), ylabel, title)
+    figure.tight_layout()
+    figure.savefig(path)
+
+# The menu's option 7: total stock per part class, then stock-outs per part class
+def show_charts(inventory):
+    show_chart(inventory.usage_totals(), *USAGE_CHART[1:])
+    show_chart(inventory.stockout_event_counts(), *STOCKOUT_CHART[1:])
+
+# Renders both charts into directory once per format from counts shaped like usage_totals() and
+# stockout_event_counts(), returns the written paths
+def render_report(usage: Dict[object, int], stockouts: Dict[object, int], directory: str,
+                  formats: Sequence[str] = ("png", "svg"), prefix: str = "") -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for (name, ylabel, title), counts in ((USAGE_CHART, usage), (STOCKOUT_CHART, stockouts)):
+        for file_format in formats:
+            path = os.path.join(directory, f"{prefix}{name}.{file_format}")
+            save_chart(counts, ylabel, title, path)
+            paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the inventory charts to image files")
+    parser.add_argument("--data", default="inventory_data", help="inventory directory written by the menu or the service")
+    parser.add_argument("--output", default="reports", help="directory to write the charts to")
+    parser.add_argument("--format", nargs="+", default=["png", "svg"], help="image formats, e.g. png svg pdf")
+    parser.add_argument("--prefix", default="", help="prefix for the file names, e.g. a date")
+    args = parser.parse_args()
+
+    from inventory_persistence import PersistentInventory
+    inventory = PersistentInventory(args.data, read_only=True)  # never touches the log of a running menu or service
+    try:
+        for path in render_report(inventory.usage_totals(), inventory.stockout_event_counts(), args.output, args.format, args.prefix):
+            print(f"Wrote {path}")
+    finally:
+        inventory.close()
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from MIL_Summer_App import Inventory, ENUM_FIELDS, part_to_dict, part_from_dict
+
+# Line-oriented JSON protocol, one object per line in each direction:
+#   request   {"id": 1, "op": "add_inventory", "sku": 1001, "quantity": 5}
+#   response  {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}
+# Clients may send any number of requests without waiting, responses carry the request id and
+# can come back out of order. Operations and their arguments:
+#   add_part       sku, part (as produced by part_to_dict)
+#   add_inventory  sku, quantity
+#   get_quantity   sku
+#   search         part_class, attributes (Enum fields by value)
+#   list_inventory cursor (null for the first page), limit, order_by_sku, returns {"rows": [...], "cursor": next}
+#   delete_part    sku
+
+CACHE_SIZE = 100000
+
+# Serves one Inventory to many clients from a single event loop. Stock adjustments that arrive in
+# the same loop iteration are merged into one apply_adjustments call with one write per SKU, and
+# get_quantity answers come from a cache that every write through the service keeps exact.
+# The inventory runs with error_mode "raise", so failed operations reach the client as ok: false.
+class InventoryService:
+    def __init__(self, inventory: Inventory):
+        self.inventory = inventory
+        self.inventory.error_mode = "raise"
+        self.pending: List[Tuple[int, int, asyncio.Future]] = []  # queued (SKU, delta, future) in arrival order
+        self.pending_skus: Set[int] = set()
+        self.flush_scheduled = False
+        self.quantity_cache: OrderedDict = OrderedDict()
+        self.coalesced = 0  # writes saved by merging
+
+    def _cached_quantity(self, sku: int) -> int:
+        quantity = self.quantity_cache.get(sku)
+        if quantity is None:
+            if sku not in self.inventory.inventory:
+                raise ValueError(f"SKU {sku} does not exist.")
+            quantity = self.quantity_cache[sku] = self.inventory.inventory[sku]["quantity"]
+            if len(self.quantity_cache) > CACHE_SIZE:
+                self.quantity_cache.popitem(last=False)
+        else:
+            self.quantity_cache.move_to_end(sku)
+        return quantity
+
+    def adjust(self, sku: int, delta: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((sku, delta, future))
+        self.pending_skus.add(sku)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return future
+
+    # Applies every queued adjustment as one batch with the deltas in arrival order, so each one is checked
+    # against the stock left by those before it. apply_adjustments skips the rows it rejects when working out
+    # the rest, so a rejected batch is answered row by row: the failed rows get their error and the batch
+    # without them is applied again.
+    def flush(self):
+        self.flush_scheduled = False
+        pending, self.pending = self.pending, []
+        self.pending_skus = set()
+        while pending:
+            report = self.inventory.apply_adjustments([sku for sku, _, _ in pending], [delta for _, delta, _ in pending])
+            if report["applied"]:
+                break
+            for row, (sku, error) in report["errors"].items():
+                self._resolve(sku, [pending[row][2]], error)
+            pending = [request for row, request in enumerate(pending) if row not in report["errors"]]
+        futures: Dict[int, List[asyncio.Future]] = {}
+        for sku, _, future in pending:
+            futures.setdefault(sku, []).append(future)
+        for sku, waiting in futures.items():
+            self._resolve(sku, waiting, None)
+
+    def _resolve(self, sku: int, futures: List[asyncio.Future], error):
+        self.quantity_cache.pop(sku, None)
+        if error is None:
+            self.coalesced += len(futures) - 1
+        for future in futures:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(self.inventory.inventory[sku]["quantity"])
+            else:
+                future.set_exception(ValueError(error))
+
+    # Handles one request, returns its result or a future for stock adjustments
+    def dispatch(self, request: Dict[str, object]):
+        op = request.get("op")
+        if op == "add_inventory":
+            return self.adjust(int(request["sku"]), int(request["quantity"]))
+        if op == "get_quantity":
+            sku = int(request["sku"])
+            if sku in self.pending_skus:
+                self.flush()  # read your own writes
+            return self._cached_quantity(sku)
+        if op == "search":
+            attributes = {attr: ENUM_FIELDS[attr](value) if attr in ENUM_FIELDS else value
+                          for attr, value in request.get("attributes", {}).items()}
+            return [part_to_dict(part) for part in self.inventory.search(str(request["part_class"]), **attributes)]
+        if op == "list_inventory":
+            limit = int(request.get("limit", 50))
+            if not 0 < limit <= self.inventory.max_page:
+                raise ValueError(f"Page size must be between 1 and {self.inventory.max_page}.")
+            if self.pending:
+                self.flush()  # read your own writes
+            rows, cursor = self.inventory.list_inventory(request.get("cursor"), limit, bool(request.get("order_by_sku", True)))
+            return {"rows": [{"sku": sku, "quantity": data["quantity"], "part": part_to_dict(data["part"])} for sku, data in rows],
+                    "cursor": cursor}
+        if op in ("add_part", "delete_part"):
+            sku = int(request["sku"])
+            if sku in self.pending_skus:
+                self.flush()
+            self.quantity_cache.pop(sku, None)
+            if op == "add_part":
+                report = self.inventory.add_parts_bulk([sku], [part_from_dict(request["part"])])
+                if not report["applied"]:
+                    raise ValueError(report["errors"][0][1])
+                return True
+            return self.inventory.delete_part(sku)
+        raise ValueError(f"Invalid operation: {op}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def respond(request_id, result=None, error=None):
+            response = {"id": request_id, "ok": error is None}
+            if error is None:
+                response["result"] = result
+            else:
+                response["error"] = error
+            writer.write(json.dumps(response).encode() + b"\n")
+
+        async def respond_later(request_id, future):
+            try:
+                respond(request_id, await future)
+            except ValueError as e:
+                respond(request_id, error=str(e))
+
+        waiting = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    result = self.dispatch(request)
+                    if isinstance(result, asyncio.Future):
+                        task = asyncio.ensure_future(respond_later(request_id, result))
+                        waiting.add(task)
+                        task.add_done_callback(waiting.discard)
+                    else:
+                        respond(request_id, result)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    respond(request_id, error=str(e))
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+            if waiting:
+                await asyncio.gather(*waiting)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(inventory: Inventory, host: str = "127.0.0.1", port: int = 8765):
+    service = InventoryService(inventory)
+    server = await asyncio.start_server(service.handle_client, host, port)
+    print(f"Inventory service listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+# Load generator: every client keeps `depth` requests in flight over its own connection
+async def run_load(host: str, port: int, clients: int, requests: int, depth: int, skus: int, seed: int):
+    rng = random.Random(seed)
+
+    async def call(reader, writer, pending, request):
+        pending[request["id"]] = (asyncio.get_running_loop().create_future(), time.perf_counter())
+        writer.write(json.dumps(request).encode() + b"\n")
+        return pending[request["id"]][0]
+
+    async def connect():
+        reader, writer = await asyncio.open_connection(host, port)
+        pending = {}
+        latencies = []
+
+        async def read_responses():
+            while pending or not writer.is_closing():
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future, started = pending.pop(response["id"])
+                latencies.append(time.perf_counter() - started)
+                future.set_result(response)
+
+        return reader, writer, pending, latencies, asyncio.ensure_future(read_responses())
+
+    # Make sure the SKUs exist
+    reader, writer, pending, _, listener = await connect()
+    for sku in range(skus):
+        part = {"type": "Resistor", "update": "2024-06-01T00:00:00", "resistance": 100 + sku % 900, "tolerance": 5}
+        await call(reader, writer, pending, {"id": sku, "op": "add_part", "sku": sku, "part": part})
+        await call(reader, writer, pending, {"id": -sku - 1, "op": "add_inventory", "sku": sku, "quantity": 1000})
+    while pending:
+        await asyncio.sleep(0.01)
+    writer.close()
+    listener.cancel()
+
+    async def client(number):
+        reader, writer, pending, latencies, listener = await connect()
+        in_flight = set()
+        for i in range(requests):
+            roll = rng.random()
+            sku = rng.randrange(skus)
+            if roll < 0.8:
+                request = {"op": "get_quantity", "sku": sku}
+            elif roll < 0.95:
+                request = {"op": "add_inventory", "sku": sku, "quantity": rng.choice((-1, 1))}
+            else:
+                request = {"op": "search", "part_class": "1", "attributes": {"resistance": 100 + sku % 900}}
+            request["id"] = number * requests + i
+            future = await call(reader, writer, pending, request)
+            in_flight.add(future)
+            future.add_done_callback(in_flight.discard)
+            if len(in_flight) >= depth:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        writer.close()
+        listener.cancel()
+        return latencies
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client(number) for number in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result in results for latency in result)
+    print(f"Requests: {len(latencies)} from {clients} clients in {elapsed:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed:.0f} requests/s")
+    print(f"Latency p50: {latencies[len(latencies) // 2] * 1000:.2f} ms, p99: {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory network service and load generator")
+    parser.add_argument("mode", choices=("serve", "load"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per client")
+    parser.add_argument("--depth", type=int, default=4, help="requests each client keeps in flight")
+    parser.add_argument("--skus", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", help="keep the served inventory in this directory (write-ahead log and snapshots)")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        if args.data:
+            from inventory_persistence import PersistentInventory
+            inventory = PersistentInventory(args.data)
+        else:
+            inventory = Inventory()
+        try:
+            asyncio.run(serve(inventory, args.host, args.port))
+        finally:
+            if args.data:
+                inventory.close()
+    else:
+        asyncio.run(run_load(args.host, args.port, args.clients, args.requests, args.depth, args.skus, args.seed))
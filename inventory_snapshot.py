@@ -0,0 +1,288 @@
+import gc
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from MIL_Summer_App import (Inventory, Part, PART_CLASSES, PART_FIELDS, PART_TYPES, to_epoch, from_epoch,
+                            SkuNotFoundError, InvalidArgumentError)
+from columnar_inventory import COLUMN_TYPES, ColumnCodec
+
+# Binary snapshot layout, all little-endian:
+#   header      magic, format version, number of sections, offset and length of the string table, and the
+#               log sequence number the snapshot covers (PersistentInventory, 0 otherwise)
+#   sections    one entry per part class: class name, record count, offset of its records, and how often
+#               SKUs of the class ran out of stock
+#   records     fixed-width rows sorted by SKU: sku, quantity, update (microseconds since the epoch), the
+#               position of the SKU in the inventory, how often it ran out of stock, the bitmask of attributes
+#               that are ints (see columnar_inventory.COLUMN_TYPES), then the part attributes in PART_FIELDS
+#               order (enum codes, string table codes or numbers)
+#   strings     JSON list of the free-text values (colors) the records refer to by index
+MAGIC = b"MILSNAP\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQQQ")
+SECTION = struct.Struct("<16sQQQ")
+
+# Codecs of every attribute of a part class, built once. Free text is encoded with a string codec of each snapshot
+# or result instead, these are only used to decode it.
+CODECS: Dict[type, Dict[str, ColumnCodec]] = {}
+
+def _codecs(part_type: type) -> Dict[str, ColumnCodec]:
+    codecs = CODECS.get(part_type)
+    if codecs is None:
+        codecs = CODECS[part_type] = {attr: ColumnCodec(COLUMN_TYPES[attr]) for attr in PART_FIELDS[part_type]}
+    return codecs
+
+def record_dtype(part_type: type) -> np.dtype:
+    fields = [("sku", "<i8"), ("quantity", "<i8"), ("update", "<i8"), ("position", "<i8"), ("stockouts", "<i8"), ("ints", "u1")]
+    for attr, codec in _codecs(part_type).items():
+        fields.append((attr, np.dtype(codec.dtype).newbyteorder("<")))
+    return np.dtype(fields)
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+# Raises InvalidArgumentError if the records cannot give the part back exactly
+def check_part(part: Part):
+    part_type = PART_TYPES.get(type(part).__name__)
+    if part_type is not type(part):
+        raise InvalidArgumentError(f"Unsupported part class: {type(part).__name__}")
+    for attr, codec in _codecs(part_type).items():
+        value = getattr(part, attr)
+        if codec.column_type is not str:
+            codec.encode(value)
+        elif not isinstance(value, str):
+            raise InvalidArgumentError(f"Invalid str value: {value!r}")
+
+# Packs (sku, quantity, part) rows of one part class into records, colors are added to the shared string codec.
+# Position and stock-outs are left at 0. Raises InvalidArgumentError for a value the records cannot give back exactly.
+def encode_records(part_type: type, rows: List[Tuple[int, int, Part]], strings: ColumnCodec) -> np.ndarray:
+    codecs = _codecs(part_type)
+    records = np.zeros(len(rows), dtype=record_dtype(part_type))
+    records["sku"] = [sku for sku, _, _ in rows]
+    records["quantity"] = [quantity for _, quantity, _ in rows]
+    records["update"] = [to_epoch(part.update) for _, _, part in rows]
+    for i, (attr, codec) in enumerate(codecs.items()):
+        codec = strings if codec.column_type is str else codec
+        records[attr], ints = codec.encode_column([getattr(part, attr) for _, _, part in rows])
+        if ints is not None:
+            records["ints"] |= ints.astype(np.uint8) << i
+    return records
+
+# Turns records back into Part objects, a column at a time
+def decode_records(part_type: type, records: np.ndarray, strings: List[str]) -> List[Part]:
+    columns = [[from_epoch(value) for value in records["update"].tolist()]]
+    ints = records["ints"].tolist()
+    for i, (attr, codec) in enumerate(_codecs(part_type).items()):
+        codes = records[attr].tolist()
+        if codec.column_type is str:
+            columns.append([strings[code] for code in codes])
+        elif codec.values is not None:
+            columns.append([codec.values[code] for code in codes])
+        else:
+            columns.append([int(code) if mask >> i & 1 else code for code, mask in zip(codes, ints)])
+    return [part_type(*values) for values in zip(*columns)]
+
+# Writes every part of an inventory (anything with get_inventory) to a binary snapshot at path, with the
+# stock-out counts of inventories that keep them (stockout_events, class_stockout_events)
+def write_snapshot(inventory, path: str, sequence: int = 0):
+    rows: Dict[type, List[Tuple[int, int, Part]]] = {}
+    positions: Dict[type, List[int]] = {}
+    # Through the class so an instrumented inventory does not count the snapshot as a get_inventory call
+    for position, (sku, data) in enumerate(type(inventory).get_inventory(inventory)):
+        part_type = PART_TYPES[type(data["part"]).__name__]
+        rows.setdefault(part_type, []).append((sku, data["quantity"], data["part"]))
+        positions.setdefault(part_type, []).append(position)
+    stockout_events = getattr(inventory, "stockout_events", {})
+    class_stockout_events = getattr(inventory, "class_stockout_events", {})
+    for part_type, count in class_stockout_events.items():
+        if count and part_type not in rows:  # every SKU of the class was deleted, its count stays
+            rows[part_type], positions[part_type] = [], []
+
+    strings = ColumnCodec(str)
+    sections = []
+    for part_type, part_rows in rows.items():
+        records = encode_records(part_type, part_rows, strings)
+        records["position"] = positions[part_type]
+        records["stockouts"] = [stockout_events.get(sku, 0) for sku, _, _ in part_rows]
+        records = records[np.argsort(records["sku"], kind="stable")]
+        sections.append((part_type.__name__, records, class_stockout_events.get(part_type, 0)))
+
+    # Lay out header, section table, record blocks and string table
+    offset = HEADER.size + SECTION.size * len(sections)
+    layout = []
+    for name, records, events in sections:
+        offset = _align(offset)
+        layout.append((name, records, events, offset))
+        offset += records.nbytes
+    string_table = json.dumps(strings.values).encode()
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(layout), offset, len(string_table), sequence))
+        for name, records, events, start in layout:
+            f.write(SECTION.pack(name.encode(), len(records), start, events))
+        for _, records, _, start in layout:
+            f.write(b"\0" * (start - f.tell()))
+            f.write(records.tobytes())
+        f.write(string_table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+# Sequence number, string table, zero-copy views of the records and stock-out counts per part class of a snapshot
+def _parse(buffer, path: str) -> Tuple[int, List[str], Dict[type, np.ndarray], Dict[type, int]]:
+    magic, version, section_count, string_offset, string_length, sequence = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an inventory snapshot.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+
+    strings = json.loads(buffer[string_offset:string_offset + string_length])
+    sections = {}
+    class_stockout_events = {}
+    for i in range(section_count):
+        name, count, offset, events = SECTION.unpack_from(buffer, HEADER.size + i * SECTION.size)
+        part_type = PART_TYPES[name.rstrip(b"\0").decode()]
+        sections[part_type] = np.frombuffer(buffer, dtype=record_dtype(part_type), count=count, offset=offset)
+        class_stockout_events[part_type] = events
+    return sequence, strings, sections, class_stockout_events
+
+# Everything in a snapshot, to load it into an inventory: (sequence, [(sku, quantity, part)] in the order the
+# inventory held them, {sku: times it ran out of stock}, {part class: times its SKUs ran out of stock})
+def read_snapshot(path: str) -> Tuple[int, List[Tuple[int, int, Part]], Dict[int, int], Dict[type, int]]:
+    with open(path, "rb") as f:
+        sequence, strings, sections, class_stockout_events = _parse(f.read(), path)
+    rows = []
+    positions = []
+    stockout_events = {}
+    for part_type, records in sections.items():
+        skus = records["sku"].tolist()
+        rows.extend(zip(skus, records["quantity"].tolist(), decode_records(part_type, records, strings)))
+        positions.extend(records["position"].tolist())
+        stockout_events.update((sku, count) for sku, count in zip(skus, records["stockouts"].tolist()) if count)
+    rows = [rows[i] for i in np.argsort(positions, kind="stable").tolist()]
+    return sequence, rows, stockout_events, class_stockout_events
+
+# Read-only inventory served straight from a memory-mapped snapshot. Opening only reads the header,
+# lookups binary search the SKU column of each section and Part objects are decoded on first access.
+# It has the read methods of Inventory with the same error modes, and can open the snapshot of a
+# PersistentInventory, which covers the stock as of its last snapshot.
+class MappedInventory:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sequence, self.strings, self.sections, self.class_stockout_events = _parse(self.buffer, path)
+        self.string_codes = {value: code for code, value in enumerate(self.strings)}
+        self.codecs: Dict[type, Dict[str, ColumnCodec]] = {part_type: _codecs(part_type) for part_type in self.sections}
+        self.parts: Dict[int, Part] = {}  # decoded parts by SKU
+        self.error_mode = "print"
+        self.last_error: Optional[Exception] = None
+        self.metrics = None  # set by inventory_metrics.instrument
+
+    _fail = Inventory._fail
+
+    def _locate(self, sku: int) -> Tuple[type, int]:
+        for part_type, records in self.sections.items():
+            skus = records["sku"]
+            row = int(np.searchsorted(skus, sku))
+            if row < len(skus) and skus[row] == sku:
+                return part_type, row
+        raise SkuNotFoundError(f"SKU {sku} does not exist.")
+
+    def _decode(self, part_type: type, row: int) -> Part:
+        record = self.sections[part_type][row]
+        sku = int(record["sku"])
+        part = self.parts.get(sku)
+        if part is None:
+            values = []
+            ints = int(record["ints"])
+            for i, (attr, codec) in enumerate(self.codecs[part_type].items()):
+                values.append(self.strings[record[attr]] if codec.column_type is str else codec.decode(record[attr], ints >> i & 1))
+            part = self.parts[sku] = part_type(from_epoch(record["update"]), *values)
+        return part
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self.sections.values())
+
+    def get_quantity(self, sku: int) -> int:
+        try:
+            part_type, row = self._locate(sku)
+            return int(self.sections[part_type]["quantity"][row])
+        except ValueError as e:
+            self._fail("get_quantity", f"Error getting quantity for part with SKU {sku}", e)
+            return 0
+
+    def get_part(self, sku: int) -> Part:
+        try:
+            return self._decode(*self._locate(sku))
+        except ValueError as e:
+            self._fail("get_part", f"Error getting part with SKU {sku}", e)
+            return None
+
+    def get_inventory(self) -> List[Tuple[int, Dict[str, Part]]]:
+        try:
+            return [(int(records["sku"][row]), {"part": self._decode(part_type, row), "quantity": int(records["quantity"][row])})
+                    for part_type, records in self.sections.items() for row in range(len(records))]
+        except Exception as e:
+            self._fail("get_inventory", "Error getting inventory", e)
+            return []
+
+    def search(self, part_class: str, **kwargs) -> List[Part]:
+        try:
+            if part_class not in PART_CLASSES:
+                raise InvalidArgumentError(f"Invalid part class: {part_class}")
+
+            part_type = PART_CLASSES[part_class]
+
+            results = []
+            for section_type, records in self.sections.items():
+                if not issubclass(section_type, part_type):
+                    continue
+                codecs = self.codecs[section_type]
+                mask = np.ones(len(records), dtype=bool)
+                for attr, value in kwargs.items():
+                    if attr not in codecs:
+                        raise InvalidArgumentError(f"Invalid attribute for {section_type.__name__}: {attr}")
+                    code = self.string_codes.get(value) if codecs[attr].column_type is str else codecs[attr].lookup(value)
+                    if code is None:
+                        mask[:] = False
+                        break
+                    mask &= records[attr] == code
+                results.extend(self._decode(section_type, row) for row in np.flatnonzero(mask))
+            return results
+        except Exception as e:
+            self._fail("search", "Error searching for part", e)
+            return []
+
+    # Total quantity in stock per part class
+    def usage_totals(self) -> Dict[type, int]:
+        return {part_type: int(records["quantity"].sum()) for part_type, records in self.sections.items() if len(records)}
+
+    # Number of SKUs currently at quantity 0 per part class
+    def out_of_stock_counts(self) -> Dict[type, int]:
+        return {part_type: int(np.count_nonzero(records["quantity"] == 0)) for part_type, records in self.sections.items() if len(records)}
+
+    # Number of times SKUs of each part class went from in stock to out of stock
+    def stockout_event_counts(self) -> Dict[type, int]:
+        return {part_type: count for part_type, count in self.class_stockout_events.items() if count}
+
+    def get_stockout_events(self, sku: int) -> int:
+        try:
+            part_type, row = self._locate(sku)
+        except SkuNotFoundError:
+            return 0
+        return int(self.sections[part_type]["stockouts"][row])
+
+    def close(self):
+        self.last_error = None
+        self.sections.clear()
+        try:
+            self.buffer.close()
+        except BufferError:
+            # Errors raised in "raise" mode sit in reference cycles with frames that still hold views of the buffer
+            gc.collect()
+            self.buffer.close()
+        self.file.close()
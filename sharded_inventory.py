@@ -0,0 +1,394 @@
+import multiprocessing
+import os
+import sys
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from MIL_Summer_App import (Inventory, Part, PART_CLASSES, PART_TYPES, CapacityError, InvalidArgumentError,
+                            _as_list)
+from columnar_inventory import ColumnCodec
+from inventory_snapshot import encode_records, decode_records, record_dtype
+
+BUFFER_SIZE = 1 << 20  # starting size of every shard's result buffer, it grows when a result does not fit
+
+# Inventory split over worker processes so that searches and aggregations use every core.
+#
+# Each worker owns a plain Inventory holding the SKUs that hash to it. Point operations go to the
+# owning worker over a pipe. Searches, get_inventory and the statistics are sent to all workers at
+# once and merged. Bulk operations are checked on every worker first and only applied when the
+# whole batch is good. Search and get_inventory results do not travel as pickled objects: each
+# worker packs them into snapshot records in a shared memory buffer and this process decodes them
+# from there. Only results the records cannot give back exactly (an unregistered part class, a value
+# like a text gauge) are pickled over the pipe instead. Parts handed out are therefore copies,
+# changing one does not change the stored part.
+#
+# Same public API as Inventory. Every call is a round trip to another process, so single small
+# operations are slower than on a plain Inventory, large searches and aggregations are faster.
+class ShardedInventory:
+    max_limit = 1000000
+    max_page = 10000
+
+    def __init__(self, shards: Optional[int] = None, ledger: bool = False):
+        self.error_mode = "print"
+        self.last_error: Optional[Exception] = None
+        self.metrics = None  # set by inventory_metrics.instrument
+        self.size = 0  # parts over all shards, for max_limit
+        self.connections = []
+        self.processes = []
+        self.buffers: List[SharedMemory] = []
+        context = multiprocessing.get_context()
+        for _ in range(shards or os.cpu_count() or 1):
+            buffer = SharedMemory(create=True, size=BUFFER_SIZE)
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_serve, args=(worker_connection, buffer.name, ledger), daemon=True)
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+            self.buffers.append(buffer)
+        self._closer = weakref.finalize(self, _shutdown, self.connections, self.processes, self.buffers)
+
+    def close(self):
+        self._closer()
+
+    def _shard(self, sku: int) -> int:
+        return hash(sku) % len(self.connections)
+
+    # Workers print errors themselves in "print" mode and stay silent otherwise, raising is done here
+    def _worker_mode(self) -> str:
+        return "print" if self.error_mode == "print" else "silent"
+
+    def _receive(self, shard: int):
+        connection = self.connections[shard]
+        status, result, error = connection.recv()
+        while status == "grow":
+            old = self.buffers[shard]
+            self.buffers[shard] = SharedMemory(create=True, size=max(result, 2 * old.size))
+            connection.send(("attach", (self.buffers[shard].name,), "silent"))
+            status, result, error = connection.recv()
+            old.close()
+            old.unlink()
+        return status, result, error
+
+    # Sends op to the given shards at once, then collects {shard: (status, result, error)}
+    def _scatter(self, op: str, requests: Dict[int, tuple], mode: str = "silent") -> Dict[int, tuple]:
+        for shard, args in requests.items():
+            self.connections[shard].send((op, args, mode))
+        return {shard: self._receive(shard) for shard in requests}
+
+    def _broadcast(self, op: str, *args) -> List[tuple]:
+        return list(self._scatter(op, {shard: args for shard in range(len(self.connections))}).values())
+
+    # Runs a point operation on the shard that owns sku
+    def _call(self, op: str, message: str, sku: int, *args):
+        status, result, error = self._scatter(op, {self._shard(sku): (sku,) + args}, self._worker_mode())[self._shard(sku)]
+        if status == "error":
+            self._fail(op, message, error)
+        elif error is not None:
+            self._worker_failed(op, error)
+        return result
+
+    _fail = Inventory._fail
+
+    # Error the worker already printed if it had to
+    def _worker_failed(self, op: str, error: Exception):
+        self.last_error = error
+        if self.metrics is not None:
+            self.metrics.record_error(op, error)
+        if self.error_mode == "raise":
+            raise error
+
+    # Results of a fan-out, or None after reporting the first error
+    def _gather(self, op: str, message: str, replies: List[tuple]) -> Optional[list]:
+        for status, result, error in replies:
+            if error is not None:
+                self._fail(op, message, error)
+                return None
+        return [result for _, result, _ in replies]
+
+    # Reads the records a worker left in its buffer as (sku, quantity, part) rows
+    def _read_rows(self, shard: int, sections: List[Tuple[str, int, int]], strings: List[str]) -> List[Tuple[int, int, Part]]:
+        rows = []
+        for name, count, offset in sections:
+            part_type = PART_TYPES[name]
+            records = np.ndarray(count, dtype=record_dtype(part_type), buffer=self.buffers[shard].buf, offset=offset).copy()
+            rows.extend(zip(records["sku"].tolist(), records["quantity"].tolist(), decode_records(part_type, records, strings)))
+        return rows
+
+    def _fetch(self, op: str, message: str, *args) -> Optional[List[Tuple[int, int, Part]]]:
+        results = self._gather(op, message, self._broadcast(op, *args))
+        if results is None:
+            return None
+        rows = []
+        for shard, (sections, payload) in enumerate(results):
+            # payload is the string table of the records, or the rows themselves if they could not be packed
+            rows.extend(self._read_rows(shard, sections, payload) if sections is not None else payload)
+        return rows
+
+    def stats(self) -> Dict[str, object]:
+        return self.metrics.stats() if self.metrics is not None else {}
+
+    def add_part(self, sku: int, part: Part) -> bool:
+        if self.size >= self.max_limit:
+            self._fail("add_part", f"Error adding part with SKU {sku}",
+                       CapacityError("Maximum number of parts reached (1 million). Cannot add more parts."))
+            return False
+        added = self._call("add_part", f"Error adding part with SKU {sku}", sku, part)
+        if added:
+            self.size += 1
+        return bool(added)
+
+    def add_inventory(self, sku: int, quantity: int) -> bool:
+        return bool(self._call("add_inventory", f"Error adding inventory for part with SKU {sku}", sku, quantity))
+
+    def get_quantity(self, sku: int) -> int:
+        return self._call("get_quantity", f"Error getting quantity for part with SKU {sku}", sku) or 0
+
+    def get_part(self, sku: int) -> Part:
+        return self._call("get_part", f"Error getting part with SKU {sku}", sku)
+
+    def get_stockout_events(self, sku: int) -> int:
+        return self._call("get_stockout_events", f"Error getting stock-outs for part with SKU {sku}", sku) or 0
+
+    def delete_part(self, sku: int) -> bool:
+        deleted = self._call("delete_part", f"Error deleting part with SKU {sku}", sku)
+        if deleted:
+            self.size -= 1
+        return bool(deleted)
+
+    # Rows of a batch per shard, in batch order
+    def _split(self, skus: List[int]) -> Dict[int, List[int]]:
+        rows: Dict[int, List[int]] = {}
+        for row, sku in enumerate(skus):
+            rows.setdefault(self._shard(sku), []).append(row)
+        return rows
+
+    def _check(self, op: str, rows: Dict[int, List[int]], requests: Dict[int, tuple]) -> Dict[int, Tuple[int, str]]:
+        errors = {}
+        for shard, (status, result, failure) in self._scatter(op, requests).items():
+            if status == "error":
+                raise failure
+            errors.update((rows[shard][row], error) for row, error in result.items())
+        return dict(sorted(errors.items()))
+
+    def add_parts_bulk(self, skus: Iterable[int], parts: Iterable[Part], quantities: Optional[Iterable[int]] = None) -> Dict[str, object]:
+        skus = _as_list(skus)
+        parts = _as_list(parts)
+        quantities = _as_list(quantities) if quantities is not None else None
+        if len(skus) != len(parts):
+            errors = {min(len(skus), len(parts)): (None, f"Got {len(skus)} SKUs for {len(parts)} parts.")}
+            return {"applied": False, "total": max(len(skus), len(parts)), "errors": errors}
+        if quantities is not None and len(quantities) != len(skus):
+            errors = {min(len(skus), len(quantities)): (None, f"Got {len(skus)} SKUs for {len(quantities)} quantities.")}
+            return {"applied": False, "total": max(len(skus), len(quantities)), "errors": errors}
+
+        rows = self._split(skus)
+        errors = self._check("_check_parts", rows, {shard: ([skus[row] for row in shard_rows], len(shard_rows))
+                                                    for shard, shard_rows in rows.items()})
+        # max_limit counts the parts of all shards together
+        room = self.max_limit - self.size
+        accepted = 0
+        for row, sku in enumerate(skus):
+            if row in errors:
+                continue
+            if accepted >= room:
+                errors[row] = (sku, "Maximum number of parts reached (1 million). Cannot add more parts.")
+            else:
+                accepted += 1
+        if quantities is not None:
+            errors.update((row, (sku, "Quantity cannot go below 0")) for row, (sku, quantity) in enumerate(zip(skus, quantities))
+                          if quantity < 0 and row not in errors)
+
+        if not errors:
+            self._scatter("add_parts_bulk", {shard: tuple([values[row] for row in shard_rows] for values in (skus, parts, quantities) if values is not None)
+                                             for shard, shard_rows in rows.items()})
+            self.size += len(skus)
+        return {"applied": not errors, "total": len(skus), "errors": dict(sorted(errors.items()))}
+
+    def apply_adjustments(self, skus: Iterable[int], deltas: Iterable[int]) -> Dict[str, object]:
+        skus = _as_list(skus)
+        deltas = _as_list(deltas)
+        if len(skus) != len(deltas):
+            errors = {min(len(skus), len(deltas)): (None, f"Got {len(skus)} SKUs for {len(deltas)} deltas.")}
+            return {"applied": False, "total": max(len(skus), len(deltas)), "errors": errors, "out_of_stock": []}
+
+        rows = self._split(skus)
+        requests = {shard: ([skus[row] for row in shard_rows], [deltas[row] for row in shard_rows]) for shard, shard_rows in rows.items()}
+        errors = self._check("check_adjustments", rows, requests)
+        out_of_stock = []
+        if not errors:
+            for _, report, _ in self._scatter("apply_adjustments", requests).values():
+                out_of_stock.extend(report["out_of_stock"])
+        return {"applied": not errors, "total": len(skus), "errors": errors, "out_of_stock": out_of_stock}
+
+    def get_inventory(self) -> List[Tuple[int, Dict[str, Part]]]:
+        rows = self._fetch("iter_inventory", "Error getting inventory", None, None, None)
+        return [(sku, {"part": part, "quantity": quantity}) for sku, quantity, part in rows or []]
+
+    iter_inventory = Inventory.iter_inventory  # checks the part class, then iterates with _iter_entries
+
+    def _iter_entries(self, part_class: Optional[str], min_quantity: Optional[int],
+                      max_quantity: Optional[int]) -> Iterator[Tuple[int, Dict[str, Part]]]:
+        rows = self._fetch("iter_inventory", "Error getting inventory", part_class, min_quantity, max_quantity)
+        for sku, quantity, part in rows or []:
+            yield sku, {"part": part, "quantity": quantity}
+
+    # Every shard sends the rows after the cursor in its own SKU order, one more than the page needs so it is
+    # known whether another page follows. The shards share no insertion order, so pages always come in SKU order.
+    def list_inventory(self, cursor: Optional[int] = None, limit: int = 50,
+                       order_by_sku: bool = True) -> Tuple[List[Tuple[int, Dict[str, Part]]], Optional[int]]:
+        if not 0 < limit <= self.max_page:
+            self._fail("list_inventory", "Error listing inventory",
+                       InvalidArgumentError(f"Page size must be between 1 and {self.max_page}."))
+            return [], None
+        rows = sorted(self._fetch("list_inventory", "Error listing inventory", cursor, limit + 1) or [], key=lambda row: row[0])
+        page = [(sku, {"part": part, "quantity": quantity}) for sku, quantity, part in rows[:limit]]
+        return page, page[-1][0] if len(rows) > limit else None
+
+    def search(self, part_class: str, **kwargs) -> List[Part]:
+        if part_class not in PART_CLASSES:
+            self._fail("search", "Error searching for part", InvalidArgumentError(f"Invalid part class: {part_class}"))
+            return []
+        rows = self._fetch("search", "Error searching for part", part_class, {}, kwargs)
+        return [part for _, _, part in rows or []]
+
+    def search_range(self, part_class: str, bounds: Dict[str, Tuple[Optional[float], Optional[float]]], **kwargs) -> List[Part]:
+        if part_class not in PART_CLASSES:
+            self._fail("search_range", "Error searching for part", InvalidArgumentError(f"Invalid part class: {part_class}"))
+            return []
+        rows = self._fetch("search_range", "Error searching for part", part_class, bounds, kwargs)
+        return [part for _, _, part in rows or []]
+
+    search_tolerance = Inventory.search_tolerance  # built on search_range, which goes through the shards
+
+    def search_nearest(self, part_class: str, attr: str, value: float, direction: str = "nearest", **kwargs) -> Optional[Part]:
+        if part_class not in PART_CLASSES:
+            self._fail("search_nearest", "Error searching for part", InvalidArgumentError(f"Invalid part class: {part_class}"))
+            return None
+        parts = self._gather("search_nearest", "Error searching for part", self._broadcast("search_nearest", part_class, attr, value, direction, kwargs))
+        candidates = [part for part in parts or [] if part is not None]
+        return min(candidates, key=lambda part: abs(getattr(part, attr) - value)) if candidates else None
+
+    # Sums {part class: count} results of all shards
+    def _merge_counts(self, op: str) -> Dict[type, int]:
+        totals: Dict[type, int] = {}
+        for _, counts, _ in self._broadcast(op):
+            for part_type, count in counts.items():
+                totals[part_type] = totals.get(part_type, 0) + count
+        return totals
+
+    def usage_totals(self) -> Dict[type, int]:
+        return self._merge_counts("usage_totals")
+
+    def out_of_stock_counts(self) -> Dict[type, int]:
+        return self._merge_counts("out_of_stock_counts")
+
+    def stockout_event_counts(self) -> Dict[type, int]:
+        return self._merge_counts("stockout_event_counts")
+
+    # Needs ShardedInventory(ledger=True), every worker then keeps a StockLedger of its own SKUs
+    def reorder_report(self, lead_time_days: float = 7, safety_days: float = 3) -> Dict[str, object]:
+        reports = self._gather("reorder_report", "Error building reorder report", self._broadcast("reorder_report", lead_time_days, safety_days))
+        if reports is None:
+            return {}
+        return {key: np.concatenate([report[key] for report in reports]) for key in reports[0]}
+
+# Operations the workers run besides the Inventory methods
+def _search(inventory: Inventory, part_class: str, bounds: Dict[str, Tuple], kwargs: Dict[str, object]) -> List[Tuple[int, int, Part]]:
+    parts = inventory.search_range(part_class, bounds, **kwargs) if bounds else inventory.search(part_class, **kwargs)
+    return [(0, 0, part) for part in parts]
+
+def _iter_inventory(inventory: Inventory, part_class: Optional[str], min_quantity: Optional[int],
+                    max_quantity: Optional[int]) -> List[Tuple[int, int, Part]]:
+    return [(sku, data["quantity"], data["part"]) for sku, data in inventory.iter_inventory(part_class, min_quantity, max_quantity)]
+
+def _list_inventory(inventory: Inventory, cursor: Optional[int], limit: int) -> List[Tuple[int, int, Part]]:
+    rows, _ = inventory._page_by_sku(cursor, limit)
+    return [(sku, data["quantity"], data["part"]) for sku, data in rows]
+
+def _search_nearest(inventory: Inventory, part_class: str, attr: str, value: float, direction: str, kwargs: Dict[str, object]):
+    return inventory.search_nearest(part_class, attr, value, direction, **kwargs)
+
+ROW_OPS = {"search": _search, "search_range": _search, "iter_inventory": _iter_inventory, "list_inventory": _list_inventory}
+WORKER_OPS = {
+    "search_nearest": _search_nearest,
+    "check_adjustments": lambda inventory, skus, deltas: inventory._check_adjustments(skus, deltas)[0],
+}
+
+# Packs rows into the shared buffer, returns ("ok", (sections, strings)) or ("grow", bytes needed).
+# Rows the records cannot give back exactly are returned as ("ok", (None, rows)) to go over the pipe.
+def _write_rows(buffer: SharedMemory, rows: List[Tuple[int, int, Part]]) -> Tuple[str, object]:
+    by_type: Dict[type, list] = {}
+    for row in rows:
+        part_type = PART_TYPES.get(type(row[2]).__name__)
+        if part_type is not type(row[2]):
+            return "ok", (None, rows)
+        by_type.setdefault(part_type, []).append(row)
+    strings = ColumnCodec(str)
+    try:
+        blocks = [(part_type, encode_records(part_type, part_rows, strings)) for part_type, part_rows in by_type.items()]
+    except InvalidArgumentError:
+        return "ok", (None, rows)
+    sections = []
+    offset = 0
+    for part_type, records in blocks:
+        sections.append((part_type.__name__, len(records), offset))
+        offset += (records.nbytes + 7) & ~7
+    if offset > buffer.size:
+        return "grow", offset
+    for (part_type, records), (_, _, start) in zip(blocks, sections):
+        np.ndarray(records.shape, dtype=records.dtype, buffer=buffer.buf, offset=start)[:] = records
+    return "ok", (sections, strings.values)
+
+def _serve(connection, buffer_name: str, ledger: bool):
+    inventory = Inventory()
+    if ledger:
+        from stock_ledger import StockLedger
+        inventory.ledger = StockLedger()
+    buffer = SharedMemory(buffer_name)
+    rows = []  # last row result, kept until it fits the buffer
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        op, args, error_mode = request
+        inventory.error_mode = error_mode
+        inventory.last_error = None
+        try:
+            if op == "attach":
+                buffer.close()
+                buffer = SharedMemory(args[0])
+                status, result = _write_rows(buffer, rows)
+            elif op in ROW_OPS:
+                rows = ROW_OPS[op](inventory, *args)
+                status, result = _write_rows(buffer, rows)
+            elif op in WORKER_OPS:
+                status, result = "ok", WORKER_OPS[op](inventory, *args)
+            else:
+                status, result = "ok", getattr(inventory, op)(*args)
+            if status == "ok":
+                rows = []
+            connection.send((status, result, inventory.last_error))
+        except Exception as e:
+            connection.send(("error", None, e))
+        if error_mode == "print":
+            sys.stdout.flush()
+    buffer.close()
+    connection.close()
+
+def _shutdown(connections, processes, buffers):
+    for connection in connections:
+        try:
+            connection.send(None)
+            connection.close()
+        except OSError:
+            pass
+    for process in processes:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+    for buffer in buffers:
+        buffer.close()
+        buffer.unlink()
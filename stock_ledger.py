@@ -0,0 +1,153 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+from MIL_Summer_App import InvalidArgumentError, to_epoch
+
+HOUR = 3600
+DAY = 86400
+UNITS_MAX = int(np.iinfo(np.int64).max)  # largest quantity or change the columns hold
+
+# Per-SKU history of stock movements with bounded memory.
+#
+# The latest `ring_size` movements of every SKU are kept as-is in a ring buffer. When a ring is full
+# the oldest movement is compacted into a bucket: consumption of the last `hours` hours is summed per
+# hour, anything older per day for the last `days` days, and older history is dropped. Bucket columns
+# stand for the same hour or day for every SKU, so moving time forward rolls or clears whole columns
+# at once. Everything is stored in NumPy arrays with one row per SKU, which makes the consumption
+# and reorder calculations single vectorized passes over all SKUs.
+class StockLedger:
+    def __init__(self, ring_size: int = 8, hours: int = 24, days: int = 28, capacity: int = 1024):
+        self.ring_size = ring_size
+        self.hours = hours
+        self.days = days
+        self.rows: Dict[int, int] = {}  # SKU -> row
+        self.free: List[int] = []
+        self.sku = np.zeros(capacity, dtype=np.int64)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.first_seen = np.zeros(capacity, dtype=np.int64)  # seconds since the epoch
+        self.times = np.zeros((capacity, ring_size), dtype=np.int64)
+        self.deltas = np.zeros((capacity, ring_size), dtype=np.int64)
+        self.position = np.zeros(capacity, dtype=np.int32)  # next ring slot to write
+        self.count = np.zeros(capacity, dtype=np.int32)  # movements in the ring
+        self.hourly = np.zeros((capacity, hours), dtype=np.int64)  # units consumed, column = hour % hours
+        self.daily = np.zeros((capacity, days), dtype=np.int64)  # units consumed, column = day % days
+        self.current_hour = None  # newest hour the buckets have been advanced to
+        self.current_day = None
+
+    def _row(self, sku: int, now: int) -> int:
+        row = self.rows.get(sku)
+        if row is not None:
+            return row
+        if self.free:
+            row = self.free.pop()
+        else:
+            row = len(self.rows)
+            if row == len(self.sku):
+                self._grow()
+        self.rows[sku] = row
+        self.sku[row] = sku
+        self.used[row] = True
+        self.first_seen[row] = now
+        return row
+
+    def _grow(self):
+        capacity = len(self.sku) * 2
+        for name in ("sku", "used", "quantity", "first_seen", "times", "deltas", "position", "count", "hourly", "daily"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # Moves the bucket clocks forward: hours that fall out of the hourly window are added to their
+    # day, days that fall out of the daily window are cleared
+    def _advance(self, now: int):
+        hour, day = now // HOUR, now // DAY
+        if self.current_hour is None:
+            self.current_hour, self.current_day = hour, day
+            return
+        if day > self.current_day:
+            for old_day in range(max(self.current_day + 1, day - self.days + 1), day + 1):
+                self.daily[:, old_day % self.days] = 0
+            self.current_day = day
+        if hour > self.current_hour:
+            for old_hour in range(self.current_hour - self.hours + 1, min(hour - self.hours, self.current_hour) + 1):
+                column = old_hour % self.hours
+                if old_hour * HOUR // DAY > day - self.days:
+                    self.daily[:, (old_hour * HOUR // DAY) % self.days] += self.hourly[:, column]
+                self.hourly[:, column] = 0
+            self.current_hour = hour
+
+    def _compact(self, row: int, when: int, delta: int):
+        if delta >= 0:
+            return  # only consumption is kept once a movement leaves the ring
+        hour, day = when // HOUR, when // DAY
+        if hour > self.current_hour - self.hours:
+            self.hourly[row, hour % self.hours] -= delta
+        elif day > self.current_day - self.days:
+            self.daily[row, day % self.days] -= delta
+
+    # Whether a change of `delta` units that leaves the SKU at `quantity` fits the columns
+    @staticmethod
+    def fits(delta: int, quantity: int) -> bool:
+        return -UNITS_MAX <= delta <= UNITS_MAX and 0 <= quantity <= UNITS_MAX
+
+    # Records a change of `delta` units that left the SKU at `quantity`, a change that does not fit
+    # raises InvalidArgumentError before anything is written
+    def record(self, sku: int, delta: int, quantity: int, when: Optional[datetime] = None):
+        if not self.fits(delta, quantity):
+            raise InvalidArgumentError(f"Quantity {quantity} is too large for the stock ledger")
+        now = to_epoch(when or datetime.now()) // 1000000
+        self._advance(now)
+        row = self._row(sku, now)
+        position = self.position[row]
+        if self.count[row] == self.ring_size:
+            self._compact(row, int(self.times[row, position]), int(self.deltas[row, position]))
+        else:
+            self.count[row] += 1
+        self.times[row, position] = now
+        self.deltas[row, position] = delta
+        self.position[row] = (position + 1) % self.ring_size
+        self.quantity[row] = quantity
+
+    def forget(self, sku: int):
+        row = self.rows.pop(sku, None)
+        if row is None:
+            return
+        self.used[row] = False
+        self.count[row] = 0
+        self.position[row] = 0
+        self.hourly[row] = 0
+        self.daily[row] = 0
+        self.free.append(row)
+
+    # Average units consumed per day over the observed part of the window, one value per row
+    def _daily_usage(self, now: int, size: int) -> np.ndarray:
+        window = self.days * DAY
+        slots = np.arange(self.ring_size)
+        recent = (slots < self.count[:size, None]) & (self.times[:size] > now - window) & (self.deltas[:size] < 0)
+        consumed = -np.where(recent, self.deltas[:size], 0).sum(axis=1, dtype=np.int64)
+        consumed += self.hourly[:size].sum(axis=1, dtype=np.int64) + self.daily[:size].sum(axis=1, dtype=np.int64)
+        observed = np.clip(now - self.first_seen[:size], HOUR, window) / DAY
+        return consumed / observed
+
+    # Consumption rate, days until stock-out and reorder point for every SKU in the ledger. The reorder
+    # point covers the usage expected during the supplier lead time plus a safety margin.
+    def reorder_report(self, lead_time_days: float = 7, safety_days: float = 3, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        seconds = to_epoch(now or datetime.now()) // 1000000
+        size = len(self.rows) + len(self.free)
+        rows = np.flatnonzero(self.used[:size])
+        usage = self._daily_usage(seconds, size)[rows]
+        quantity = self.quantity[rows]
+        with np.errstate(divide="ignore"):
+            days_left = np.where(usage > 0, quantity / np.where(usage > 0, usage, 1), np.inf)
+        reorder_point = np.ceil(usage * (lead_time_days + safety_days)).astype(np.int64)
+        return {
+            "sku": self.sku[rows],
+            "quantity": quantity,
+            "daily_usage": usage,
+            "days_until_stockout": days_left,
+            "reorder_point": reorder_point,
+            "reorder": quantity <= reorder_point
+        }